@@ -2,18 +2,35 @@
 # -*- coding: utf-8 -*-
 """
 Device Platform Generator
-"""
 
-from . import pkg
-from . import exception
-from . import device_file
-from . import device_identifier
-from . import device
-from . import parser
+The submodules and the exported names are imported lazily on first access,
+so that e.g. `from modm_devices import naturalkey` does not import lxml.
+"""
 
-from .pkg import naturalkey
-from .exception import ParserException
+import importlib
 
-__all__ = ['exception', 'device_file', 'device_identifier', 'device', 'parser', 'pkg']
+__all__ = ['exception', 'device_file', 'device_identifier', 'naming_schema', 'device', 'parser', 'pkg', 'index', 'catalog', 'database', 'equivalence']
 
 __version__ = "0.10.1"
+
+# Exported names and the submodule that defines them
+_exports = {
+    'naturalkey': 'pkg',
+    'ParserException': 'exception',
+    'find_device': 'index',
+    'find_devices': 'index',
+}
+
+
+def __getattr__(name):
+    if name in _exports:
+        value = getattr(importlib.import_module('.' + _exports[name], __name__), name)
+        globals()[name] = value
+        return value
+    if name in __all__:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_exports) + __all__)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of parsed device files.
+
+Each cache entry stores a header with the modm-devices version, the absolute
+path, the modification time and the SHA-256 of the device file, followed by
+the compact tuple serialization of its element tree (see `element.py`).
+Both are written with `marshal`, so a warm load never touches lxml.
+
+Note that files pulled in via XInclude are not tracked by the cache key.
+
+Device files can also be accompanied by a pre-resolved file next to them
+(`<name>.xml.bin`), which additionally contains the resolved properties of
+all devices, so that loading it neither parses XML nor resolves selectors.
+"""
+
+import os
+import sys
+import marshal
+import hashlib
+import tempfile
+
+from . import element
+
+_CACHE_FORMAT = 1
+
+
+def _version():
+    from . import __version__
+    return (_CACHE_FORMAT, __version__, sys.version_info[:2])
+
+
+def _hash_file(filename):
+    with open(filename, "rb") as infile:
+        return hashlib.sha256(infile.read()).hexdigest()
+
+
+class DeviceFileCache:
+    def __init__(self, directory):
+        self.directory = os.path.abspath(str(directory))
+
+    def _entry(self, path):
+        name = hashlib.sha1(path.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + ".bin")
+
+    def load(self, filename):
+        """
+        Return the cached root element of the device file or None if the
+        cache entry is missing or out of date.
+        """
+        path = os.path.abspath(str(filename))
+        try:
+            stat = os.stat(path)
+            with open(self._entry(path), "rb") as entry:
+                version, cpath, mtime, size, digest = marshal.load(entry)
+                if version != _version() or cpath != path:
+                    return None
+                touched = (mtime, size) != (stat.st_mtime_ns, stat.st_size)
+                # The file was touched, but the content may still be the same
+                if touched and (size != stat.st_size or digest != _hash_file(path)):
+                    return None
+                tree = marshal.loads(entry.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if touched:
+            try:
+                self._write(path, stat, digest, tree)
+            except OSError:
+                pass
+        return element.from_tuple(tree)
+
+    def store(self, filename, rootnode):
+        """
+        Serialize the root element of the device file into the cache.
+        """
+        path = os.path.abspath(str(filename))
+        try:
+            self._write(path, os.stat(path), _hash_file(path), element.to_tuple(rootnode))
+        except OSError:
+            pass
+
+    def _write(self, path, stat, digest, tree):
+        os.makedirs(self.directory, exist_ok=True)
+        header = (_version(), path, stat.st_mtime_ns, stat.st_size, digest)
+        fd, tmpname = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as entry:
+                marshal.dump(header, entry)
+                marshal.dump(tree, entry)
+            os.replace(tmpname, self._entry(path))
+        except OSError:
+            os.unlink(tmpname)
+            raise
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".bin"):
+                os.unlink(os.path.join(self.directory, name))
+
+
+RESOLVED_SUFFIX = ".bin"
+
+
+def resolved_filename(filename):
+    return str(filename) + RESOLVED_SUFFIX
+
+
+def store_resolved(device_file):
+    """
+    Write the element tree and the properties of all devices of the device
+    file into the pre-resolved file next to it.
+    """
+    path = resolved_filename(device_file.filename)
+    tmpname = path + ".tmp"
+    with open(tmpname, "wb") as resolved:
+        marshal.dump(_version(), resolved)
+        marshal.dump((element.to_tuple(device_file.rootnode),
+                      device_file.get_all_properties()), resolved)
+    os.replace(tmpname, path)
+    return path
+
+
+def load_resolved(filename):
+    """
+    Returns:
+        the tuple tree and the properties of all devices from the
+        pre-resolved file or None if it is missing, older than the device
+        file or written by another version.
+    """
+    path = resolved_filename(filename)
+    try:
+        if os.stat(path).st_mtime_ns < os.stat(str(filename)).st_mtime_ns:
+            return None
+        with open(path, "rb") as resolved:
+            if marshal.load(resolved) != _version():
+                return None
+            return marshal.loads(resolved.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar catalog of device properties for selecting devices.
+
+The most common selection criteria of all devices are flattened into one
+column per property, so that queries like "flash >= 512 KiB, at least three
+USARTs, an FPU and a LQFP100 package" do not need to walk the property trees:
+
+    catalog.query(("flash", ">=", 512 * 1024), ("driver:usart", ">=", 3),
+                  ("fpu", "==", 1), ("package", "==", "LQFP100"))
+
+Numeric columns are stored as NumPy arrays if NumPy is installed, otherwise as
+`array.array`. String columns are stored as integer codes into a sorted list
+of categories. Building the catalog resolves all device files, so it can be
+saved to and loaded from a file.
+"""
+
+import re
+import array
+import marshal
+import operator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import pkg
+from .exception import ParserException
+
+CATALOG_VERSION = 1
+
+_OPERATORS = {
+    "==": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le,
+    ">": operator.gt, ">=": operator.ge,
+}
+# Memories that are not RAM or that alias another RAM region, like the nRF
+# code_ram, which maps the ram into the code address space
+_NOT_RAM = {"flash", "extflash", "eeprom", "backup", "bkpsram", "code_ram"}
+_FPU = re.compile(r"cortex-m\d+\+?f")
+
+
+def _extract(partname, identifier, properties):
+    """
+    Flatten the properties of one device into a row of the catalog.
+    """
+    row = {"partname": partname,
+           "platform": identifier.get("platform") or "",
+           "core": "", "fpu": 0, "flash": 0, "ram": 0, "eeprom": 0,
+           "vectors": 0, "package": "", "pins": 0, "gpios": 0}
+    for driver in properties["driver"]:
+        name = driver["name"]
+        if name == "core":
+            row["core"] = driver.get("type", "")
+            row["fpu"] = int(_FPU.match(row["core"]) is not None)
+            row["vectors"] = len(driver.get("vector", []))
+            for memory in driver.get("memory", []):
+                size = int(memory.get("size", "0"), 0)
+                if memory["name"] in ("flash", "eeprom"):
+                    row[memory["name"]] += size
+                elif memory["name"] not in _NOT_RAM:
+                    row["ram"] += size
+        elif name == "gpio":
+            row["gpios"] = len(driver.get("gpio", []))
+            packages = driver.get("package", [])
+            if packages:
+                row["package"] = packages[0]["name"]
+                row["pins"] = len(packages[0].get("pin", []))
+        key = "driver:" + name
+        row[key] = row.get(key, 0) + (len(driver.get("instance", [])) or 1)
+    return row
+
+
+def _numeric(values):
+    """
+    Convert a list of integers or their int64 bytes into a column.
+    """
+    if isinstance(values, bytes):
+        if numpy is not None:
+            return numpy.frombuffer(values, dtype=numpy.int64).copy()
+        column = array.array("q")
+        column.frombytes(values)
+        return column
+    if numpy is not None:
+        return numpy.array(values, dtype=numpy.int64)
+    return array.array("q", values)
+
+
+def _to_bytes(column):
+    if numpy is not None:
+        return column.astype(numpy.int64).tobytes()
+    return column.tobytes()
+
+
+class Catalog:
+    def __init__(self, partnames, numeric, categorical):
+        """
+        Args:
+            partnames: list of the partnames, one per row.
+            numeric: dictionary of column name and list of integers.
+            categorical: dictionary of column name and a tuple of the sorted
+                categories and the list of category codes.
+            Instead of lists of integers, their int64 bytes can be passed.
+        """
+        self.partnames = list(partnames)
+        self._numeric = {k: _numeric(v) for k, v in numeric.items()}
+        self._categories = {k: list(c) for k, (c, _) in categorical.items()}
+        self._codes = {k: _numeric(v) for k, (_, v) in categorical.items()}
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = sorted(rows, key=lambda r: r["partname"])
+        columns = sorted({k for row in rows for k in row if k != "partname"})
+        numeric = {}
+        categorical = {}
+        for column in columns:
+            values = [row.get(column, 0) for row in rows]
+            if any(isinstance(v, str) for v in values):
+                values = [row.get(column, "") for row in rows]
+                categories = sorted(set(values))
+                codes = {c: i for i, c in enumerate(categories)}
+                categorical[column] = (categories, [codes[v] for v in values])
+            else:
+                numeric[column] = values
+        return cls([row["partname"] for row in rows], numeric, categorical)
+
+    @classmethod
+    def from_device_files(cls, device_files):
+        rows = []
+        for device_file in device_files:
+            properties = device_file.get_all_properties()
+            for device in device_file.get_devices():
+                rows.append(_extract(device.partname, device._identifier,
+                                     properties[device.partname]))
+        return cls.from_rows(rows)
+
+    def columns(self):
+        return sorted(list(self._numeric) + list(self._codes))
+
+    def __len__(self):
+        return len(self.partnames)
+
+    def __getitem__(self, column):
+        """
+        Return the values of a column as a list.
+        """
+        if column == "partname":
+            return list(self.partnames)
+        if column in self._codes:
+            categories = self._categories[column]
+            return [categories[c] for c in self._codes[column]]
+        return list(self._column(column))
+
+    def _column(self, column):
+        values = self._numeric.get(column)
+        if values is None:
+            if not column.startswith("driver:"):
+                raise ParserException("Unknown catalog column '{}'!".format(column))
+            # Drivers that no device has
+            values = _numeric([0] * len(self))
+        return values
+
+    def mask(self, column, op, value):
+        """
+        Returns:
+            the mask of the rows for which `column op value` is true, as NumPy
+            boolean array or as a bytearray of 0 and 1.
+        """
+        if op == "in":
+            masks = [self.mask(column, "==", v) for v in value]
+            return self._reduce(masks, any_of=True) if masks else self._fill(0)
+        compare = _OPERATORS.get(op)
+        if compare is None:
+            raise ParserException("Unknown catalog operator '{}'!".format(op))
+        if column in self._codes:
+            if op not in ("==", "!="):
+                raise ParserException("Column '{}' only supports '==', '!=' and 'in'!".format(column))
+            categories = self._categories[column]
+            if value not in categories:
+                return self._fill(op == "!=")
+            values, value = self._codes[column], categories.index(value)
+        else:
+            values = self._column(column)
+        if numpy is not None:
+            return compare(values, value)
+        return bytearray(compare(v, value) for v in values)
+
+    def _fill(self, value):
+        if numpy is not None:
+            return numpy.full(len(self), bool(value))
+        return bytearray([int(value)]) * len(self)
+
+    def _reduce(self, masks, any_of=False):
+        if numpy is not None:
+            return (numpy.logical_or if any_of else numpy.logical_and).reduce(masks)
+        # Combine all bytes at once as big integers
+        combine = operator.or_ if any_of else operator.and_
+        result = int.from_bytes(masks[0], "little")
+        for mask in masks[1:]:
+            result = combine(result, int.from_bytes(mask, "little"))
+        return bytearray(result.to_bytes(len(self), "little"))
+
+    def query(self, *conditions):
+        """
+        Return the partnames of all devices matching all conditions.
+
+        Args:
+            conditions: tuples of (column, operator, value), the operator is
+                one of `==`, `!=`, `<`, `<=`, `>`, `>=` or `in`.
+        """
+        if not conditions:
+            return list(self.partnames)
+        mask = self._reduce([self.mask(*condition) for condition in conditions])
+        if numpy is not None:
+            return [self.partnames[i] for i in numpy.flatnonzero(mask)]
+        return [p for p, m in zip(self.partnames, mask) if m]
+
+    def save(self, filename):
+        data = {"version": CATALOG_VERSION,
+                "partnames": self.partnames,
+                "numeric": {k: _to_bytes(v) for k, v in self._numeric.items()},
+                "categorical": {k: (self._categories[k], _to_bytes(v))
+                                for k, v in self._codes.items()}}
+        with open(filename, "wb") as catalog_file:
+            marshal.dump(data, catalog_file)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Returns:
+            the catalog or None if the file is missing or of another version.
+        """
+        try:
+            with open(filename, "rb") as catalog_file:
+                data = marshal.load(catalog_file)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if data.get("version") != CATALOG_VERSION:
+            return None
+        return cls(data["partnames"], data["numeric"], data["categorical"])
+
+
+def build_catalog(filenames=None, parser=None):
+    """
+    Parse the device files, by default all bundled ones, and return their
+    catalog.
+    """
+    from .parser import DeviceParser
+    if filenames is None:
+        filenames = list(pkg.iter_device_files())
+    parser = parser or DeviceParser()
+    return Catalog.from_device_files(parser.parse_all(filenames))
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite export of resolved device properties.
+
+All devices are written into one normalized database, so that lookups and
+joins across devices are indexed SQL queries instead of parsing XML:
+
+    devices   (id, partname, naming_schema, filename)
+    memories  (device_id, name, access, start, size)
+    vectors   (device_id, position, name)
+    drivers   (id, device_id, name, type)
+    instances (driver_id, name)
+    gpios     (id, device_id, port, pin)
+    signals   (gpio_id, driver, instance, name, af, function, position)
+
+Signal attributes that a platform does not have (e.g. `af` on AVR) are NULL.
+The `index` attribute of a signal is stored as `position`.
+
+The signals are additionally stored as an inverted index from the signal
+to all pins that can carry it, covered by a single SQL index:
+
+    signal_pins (driver, instance, name, partname, port, pin, af)
+"""
+
+import os
+import pathlib
+import sqlite3
+
+from . import pkg
+from .exception import ParserException
+
+DATABASE_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE devices (
+    id INTEGER PRIMARY KEY,
+    partname TEXT NOT NULL UNIQUE,
+    naming_schema TEXT NOT NULL,
+    filename TEXT NOT NULL);
+CREATE TABLE memories (
+    device_id INTEGER NOT NULL REFERENCES devices(id),
+    name TEXT NOT NULL,
+    access TEXT,
+    start INTEGER,
+    size INTEGER);
+CREATE TABLE vectors (
+    device_id INTEGER NOT NULL REFERENCES devices(id),
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL);
+CREATE TABLE drivers (
+    id INTEGER PRIMARY KEY,
+    device_id INTEGER NOT NULL REFERENCES devices(id),
+    name TEXT NOT NULL,
+    type TEXT);
+CREATE TABLE instances (
+    driver_id INTEGER NOT NULL REFERENCES drivers(id),
+    name TEXT NOT NULL);
+CREATE TABLE gpios (
+    id INTEGER PRIMARY KEY,
+    device_id INTEGER NOT NULL REFERENCES devices(id),
+    port TEXT,
+    pin TEXT);
+CREATE TABLE signals (
+    gpio_id INTEGER NOT NULL REFERENCES gpios(id),
+    driver TEXT,
+    instance TEXT,
+    name TEXT NOT NULL,
+    af TEXT,
+    function TEXT,
+    position TEXT);
+CREATE TABLE signal_pins (
+    driver TEXT,
+    instance TEXT,
+    name TEXT NOT NULL,
+    partname TEXT NOT NULL,
+    port TEXT,
+    pin TEXT,
+    af TEXT);
+CREATE INDEX memories_device ON memories(device_id);
+CREATE INDEX vectors_device ON vectors(device_id, name);
+CREATE INDEX drivers_device ON drivers(device_id, name, type);
+CREATE INDEX drivers_name ON drivers(name, type);
+CREATE INDEX instances_driver ON instances(driver_id);
+CREATE INDEX gpios_device ON gpios(device_id, port, pin);
+CREATE INDEX signals_gpio ON signals(gpio_id);
+CREATE INDEX signals_name ON signals(driver, name, instance, af);
+"""
+
+_SIGNAL_INDEX = """
+INSERT INTO signal_pins
+    SELECT driver, instance, signals.name, partname, port, pin, af
+    FROM signals JOIN gpios ON gpios.id = gpio_id JOIN devices ON devices.id = device_id
+    ORDER BY devices.id, gpios.id, signals.rowid;
+CREATE INDEX signal_pins_signal ON signal_pins(driver, instance, name, partname, port, pin, af);
+"""
+
+
+def _int(value):
+    return None if value is None else int(value, 0)
+
+
+def _insert_device(cursor, partname, naming_schema, filename, properties):
+    cursor.execute("INSERT INTO devices (partname, naming_schema, filename) VALUES (?, ?, ?)",
+                   (partname, naming_schema, filename))
+    device_id = cursor.lastrowid
+    for driver in properties["driver"]:
+        cursor.execute("INSERT INTO drivers (device_id, name, type) VALUES (?, ?, ?)",
+                       (device_id, driver["name"], driver.get("type")))
+        driver_id = cursor.lastrowid
+        cursor.executemany("INSERT INTO instances (driver_id, name) VALUES (?, ?)",
+                           ((driver_id, i) for i in driver.get("instance", [])))
+        if driver["name"] == "core":
+            cursor.executemany("INSERT INTO memories (device_id, name, access, start, size) "
+                               "VALUES (?, ?, ?, ?, ?)",
+                               ((device_id, m["name"], m.get("access"),
+                                 _int(m.get("start")), _int(m.get("size")))
+                                for m in driver.get("memory", [])))
+            cursor.executemany("INSERT INTO vectors (device_id, position, name) VALUES (?, ?, ?)",
+                               ((device_id, int(v["position"]), v["name"])
+                                for v in driver.get("vector", [])))
+        elif driver["name"] == "gpio":
+            for gpio in driver.get("gpio", []):
+                cursor.execute("INSERT INTO gpios (device_id, port, pin) VALUES (?, ?, ?)",
+                               (device_id, gpio.get("port"), gpio.get("pin")))
+                gpio_id = cursor.lastrowid
+                cursor.executemany("INSERT INTO signals (gpio_id, driver, instance, name, af, "
+                                   "function, position) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   ((gpio_id, s.get("driver"), s.get("instance"), s["name"],
+                                     s.get("af"), s.get("function"), s.get("index"))
+                                    for s in gpio.get("signal", [])))
+
+
+def export_database(filename, filenames=None, parser=None):
+    """
+    Resolve the device files, by default all bundled ones, and write all
+    their devices into a new SQLite database.
+    """
+    from .parser import DeviceParser
+    if filenames is None:
+        filenames = list(pkg.iter_device_files())
+    parser = parser or DeviceParser()
+
+    if os.path.exists(filename):
+        os.unlink(filename)
+    connection = sqlite3.connect(filename)
+    try:
+        with connection:
+            connection.executescript(_SCHEMA)
+            connection.execute("PRAGMA user_version = {}".format(DATABASE_VERSION))
+            cursor = connection.cursor()
+            for device_file in parser.parse_all(filenames):
+                properties = device_file.get_all_properties()
+                name = os.path.basename(device_file.filename)
+                for device in device_file.get_devices():
+                    _insert_device(cursor, device.partname, device.naming_schema,
+                                   name, properties[device.partname])
+            connection.executescript(_SIGNAL_INDEX)
+    finally:
+        connection.close()
+
+
+class DeviceDatabase:
+    """
+    Read-only queries over a database written by `export_database`.
+    """
+    def __init__(self, filename):
+        if not os.path.exists(filename):
+            raise ParserException("Device database '{}' not found!".format(filename))
+        uri = pathlib.Path(filename).resolve().as_uri() + "?mode=ro"
+        self.connection = sqlite3.connect(uri, uri=True)
+        self.connection.row_factory = sqlite3.Row
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != DATABASE_VERSION:
+            raise ParserException("Device database '{}' has version {}, expected {}!"
+                                  .format(filename, version, DATABASE_VERSION))
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql, parameters=()):
+        return self.connection.execute(sql, parameters).fetchall()
+
+    def partnames(self, pattern="*"):
+        """
+        Return the sorted partnames matching the GLOB pattern.
+        """
+        return [row[0] for row in self.execute(
+                "SELECT partname FROM devices WHERE partname GLOB ? ORDER BY partname",
+                (pattern.lower(),))]
+
+    def memories(self, partname):
+        return self.execute("SELECT memories.name, access, start, size FROM memories "
+                            "JOIN devices ON devices.id = device_id "
+                            "WHERE partname = ? ORDER BY memories.rowid", (partname,))
+
+    def vectors(self, partname):
+        return self.execute("SELECT position, vectors.name FROM vectors "
+                            "JOIN devices ON devices.id = device_id "
+                            "WHERE partname = ? ORDER BY position", (partname,))
+
+    def drivers(self, partname, name=None):
+        """
+        Return the name, type and the list of instances of the drivers.
+        """
+        sql = ("SELECT drivers.id, drivers.name, type FROM drivers "
+               "JOIN devices ON devices.id = device_id WHERE partname = ?")
+        parameters = [partname]
+        if name is not None:
+            sql += " AND drivers.name = ?"
+            parameters.append(name)
+        drivers = []
+        for row in self.execute(sql + " ORDER BY drivers.id", parameters):
+            instances = [r[0] for r in self.execute(
+                    "SELECT name FROM instances WHERE driver_id = ? ORDER BY rowid", (row[0],))]
+            drivers.append((row[1], row[2], instances))
+        return drivers
+
+    def signals(self, pattern="*", driver=None, instance=None, name=None, af=None):
+        """
+        Return all pins carrying a signal on the devices matching the GLOB
+        pattern, as rows of (partname, port, pin, driver, instance, name, af).
+        Arguments that are None are not filtered.
+
+        Example: the pins carrying USART2_TX at AF7 on all STM32F411:
+            db.signals("stm32f411*", "usart", "2", "tx", "7")
+        """
+        sql = ("SELECT partname, port, pin, driver, instance, signals.name, af "
+               "FROM signals JOIN gpios ON gpios.id = gpio_id "
+               "JOIN devices ON devices.id = device_id WHERE partname GLOB ?")
+        parameters = [pattern.lower()]
+        for column, value in (("driver", driver), ("instance", instance),
+                              ("signals.name", name), ("af", af)):
+            if value is not None:
+                sql += " AND {} = ?".format(column)
+                parameters.append(value)
+        return self.execute(sql + " ORDER BY partname, gpios.id, signals.rowid", parameters)
+
+    def pins(self, driver, instance, name, pattern="*"):
+        """
+        Return all pins that can carry the signal on the devices matching the
+        GLOB pattern, as rows of (partname, port, pin, af), using the inverted
+        signal index. An instance of None matches signals without instance.
+
+        Example: the pins that can carry USART2_TX on all STM32F4:
+            db.pins("usart", "2", "tx", "stm32f4*")
+        """
+        return self.execute("SELECT partname, port, pin, af FROM signal_pins "
+                            "WHERE driver = ? AND instance IS ? AND name = ? AND partname GLOB ? "
+                            "ORDER BY partname, rowid", (driver, instance, name, pattern.lower()))
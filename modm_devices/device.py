@@ -6,7 +6,6 @@
 # All rights reserved.
 
 import copy
-import itertools
 
 from .exception import ParserException
 from .device_identifier import DeviceIdentifier
@@ -15,23 +14,90 @@ from .device_identifier import DeviceIdentifier
 class Device:
     def __init__(self,
                  identifier: DeviceIdentifier,
-                 device_file):
+                 device_file,
+                 readonly: bool = False,
+                 lazy: bool = False):
+        """
+        Args:
+            readonly: If True, `properties` and the driver accessors return
+                frozen views of the property tree (read-only mappings and
+                tuples) that are shared instead of deep copied.
+            lazy: If True, the driver accessors only resolve the drivers they
+                return instead of the whole property tree.
+        """
         self._identifier = identifier.copy()
         self.naming_schema = identifier.naming_schema
         self.partname = identifier.string
         self.device_file = device_file
+        self.readonly = readonly
+        self.lazy = lazy
 
         self._properties = None
+        self._frozen_properties = None
+        self._driver_index = None
+        self._driver_nodes = None
+        self._drivers = None
+        self._fingerprints = {}
 
     def __parse_properties(self):
         """
         Perform a lazy initialization of the driver property tree.
         """
         if self._properties is None:
-            self._properties = self.device_file.get_properties(self._identifier)
+            self._properties = self.device_file._get_shared_properties(self._identifier)
+
+    def __freeze_properties(self):
+        """
+        Perform a lazy initialization of the frozen driver property tree.
+        """
+        if self._frozen_properties is None:
+            self._frozen_properties = self.device_file.get_frozen_properties(self._identifier)
+        return self._frozen_properties
+
+    def __drivers(self):
+        if self.readonly:
+            return self.__freeze_properties()["driver"]
+        self.__parse_properties()
+        return self._properties["driver"]
+
+    def __driver(self, position):
+        """
+        Return the driver at this position of the driver list, which in lazy
+        mode is resolved and cached on first access.
+        """
+        if self._drivers is None:
+            return self.__drivers()[position]
+        driver = self._drivers[position]
+        if driver is None:
+            driver = self.device_file.get_driver_properties(self._identifier,
+                                                            self._driver_nodes[position])
+            if self.readonly:
+                driver = self.device_file.interner.intern(driver)
+            self._drivers[position] = driver
+        return driver
+
+    def __driver_names(self):
+        """
+        Yields the name and type of all drivers in the order of the driver list.
+        """
+        if not self.lazy or self._properties is not None:
+            for driver in self.__drivers():
+                yield driver["name"], driver.get("type")
+            return
+        self._driver_nodes = self.device_file.get_driver_nodes(self._identifier)
+        self._drivers = [None] * len(self._driver_nodes)
+        for position, node in enumerate(self._driver_nodes):
+            if node.find("attribute-name") is not None or node.find("attribute-type") is not None:
+                # The name or type depends on the device
+                driver = self.__driver(position)
+                yield driver["name"], driver.get("type")
+            else:
+                yield node.get("name"), node.get("type")
 
     @property
     def properties(self):
+        if self.readonly:
+            return self.__freeze_properties()
         self.__parse_properties()
         return copy.deepcopy(self._properties)
 
@@ -39,41 +105,97 @@ class Device:
     def identifier(self):
         return self._identifier.copy()
 
-    def get_all_drivers(self, name):
-        self.__parse_properties()
+    def __index_drivers(self):
+        """
+        Perform a lazy initialization of the driver index, which maps the
+        driver names to the positions of all drivers with this name and to
+        the positions of the drivers per type.
+        """
+        if self._driver_index is None:
+            index = {}
+            for position, (name, type) in enumerate(self.__driver_names()):
+                positions, types = index.setdefault(name, ([], {}))
+                positions.append(position)
+                types.setdefault(type, []).append(position)
+            self._driver_index = index
+        return self._driver_index
+
+    def __find_positions(self, name):
         parts = name.split(":")
-        results = []
-
-        if len(parts) == 1:
-            results = [d for d in self._properties["driver"] if d["name"] == parts[0]]
-        elif len(parts) == 2:
-            find_all = (parts[1][-1] == '*')
-            for driver in self._properties["driver"]:
-                if driver["name"] == parts[0] and \
-                        ((find_all and driver["type"].startswith(parts[1][:-1])) or
-                        (not find_all and driver["type"] == parts[1])):
-                    results.append(driver)
-        else:
+        if len(parts) > 2:
             raise ParserException("Invalid driver name '{}'. "
                                   "The name must contain no or one ':' to "
                                   "separate type and name.".format(name))
 
-        return copy.deepcopy(results)
+        index = self.__index_drivers().get(parts[0])
+        if index is None:
+            return []
+        positions, types = index
+        if len(parts) == 2:
+            if parts[1][-1] == '*':
+                prefix = parts[1][:-1]
+                positions = sorted(p for t, tpositions in types.items()
+                                   if t is not None and t.startswith(prefix)
+                                   for p in tpositions)
+            else:
+                positions = types.get(parts[1], [])
+        return positions
+
+    def __find_drivers(self, name):
+        return [self.__driver(p) for p in self.__find_positions(name)]
+
+    def get_all_drivers(self, name):
+        results = self.__find_drivers(name)
+        return tuple(results) if self.readonly else copy.deepcopy(results)
 
     def get_driver(self, name):
-        results = self.get_all_drivers(name)
-        return results[0] if len(results) else None
+        results = self.__find_drivers(name)
+        if not len(results):
+            return None
+        return results[0] if self.readonly else copy.deepcopy(results[0])
 
     def has_driver(self, name, type: list = []):
         if len(type) == 0:
-            return self.get_driver(name) is not None
+            return len(self.__find_positions(name)) > 0
 
         if ':' in name:
             raise ParserException("Invalid driver name '{}'. "
                                   "The name must contain no ':' when using the "
                                   "compatible argument.".format(name))
 
-        return any(self.get_driver(name + ':' + c) is not None for c in type)
+        return any(len(self.__find_positions(name + ':' + c)) > 0 for c in type)
+
+    def fingerprint(self, ignore=()):
+        """
+        Args:
+            ignore: Property keys whose subtrees are not fingerprinted, e.g.
+                `("package",)` to ignore the pinout.
+
+        Returns:
+            a stable digest of the properties of this device, which only
+            changes if the content of the properties changes.
+        """
+        key = (None, frozenset(ignore))
+        if key not in self._fingerprints:
+            if self.readonly:
+                properties = self.__freeze_properties()
+            else:
+                self.__parse_properties()
+                properties = self._properties
+            self._fingerprints[key] = self.device_file.interner.fingerprint(properties, ignore)
+        return self._fingerprints[key]
+
+    def driver_fingerprint(self, name):
+        """
+        Returns:
+            a stable digest of all drivers matching the name, which accepts
+            the same `name:type` syntax as `get_all_drivers()`, or None if no
+            driver matches.
+        """
+        if name not in self._fingerprints:
+            drivers = self.__find_drivers(name)
+            self._fingerprints[name] = self.device_file.interner.fingerprint(drivers) if drivers else None
+        return self._fingerprints[name]
 
     def __str__(self):
         return self.partname
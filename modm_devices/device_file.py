@@ -5,16 +5,59 @@
 # Copyright (c) 2016, Niklas Hauser
 # All rights reserved.
 
-import lxml.etree
-
 from collections import defaultdict
 
+from . import element
+from . import frozen
+from .equivalence import group_devices
 from .device import Device
 from .device_identifier import DeviceIdentifier
 from .device_identifier import MultiDeviceIdentifier
+from .device_identifier import DeviceIdentifierUniverse
+from .naming_schema import get_naming_schema
 
 from .exception import ParserException
 
+class Converter:
+    """
+    Converts a (sub-)tree of a device file into the property dictionary of a
+    single device.
+    """
+    def __init__(self, identifier: DeviceIdentifier, is_valid=None):
+        """
+        Args:
+            is_valid: Optional function matching the selectors of a node
+                against the identifier, defaults to `DeviceFile.is_valid`.
+        """
+        self.identifier = identifier
+        self.selector = is_valid
+
+    def is_valid(self, node):
+        if DeviceFile._is_ignored(node):
+            return False
+        if self.selector is not None:
+            return self.selector(node)
+        return DeviceFile.is_valid(node, self.identifier)
+
+    def strip_attrib(self, node):
+        stripped_keys = filter(lambda k: not k.startswith(DeviceFile._PREFIX_ATTRIBUTE_DEVICE), node.attrib.keys())
+        if node.getparent().getparent() is None and node.tag == 'device':
+            stripped_keys = filter(lambda k: k not in self.identifier.keys(), stripped_keys)
+        return {k:node.attrib[k] for k in stripped_keys}
+
+    def to_dict(self, t):
+        if not isinstance(t.tag, str):
+            # Remove comments in the XML file from the generated dict.
+            return {}
+        attrib = self.strip_attrib(t)
+        children = []
+        for c in t:
+            if self.is_valid(c):
+                children.append(c)
+        return DeviceFile._to_dict(t.tag, attrib,
+                                   map(self.to_dict, children) if children else None)
+
+
 class DeviceFile:
     _PREFIX_ATTRIBUTE = 'attribute-'
     _PREFIX_ATTRIBUTE_DEVICE = 'device-'
@@ -26,13 +69,52 @@ class DeviceFile:
         self.filename = filename
         self.rootnode = rootnode
 
+        self._identifiers = None
+        self._device_bits = None
+        self._selectors = None
+        self._universe = None
+        self._all_properties = None
+        self._frozen_properties = None
+        # Frozen property trees of this file are interned here
+        self.interner = frozen.Interner()
+
+    def __getstate__(self):
+        # lxml trees cannot be pickled, use the compact tuple tree instead.
+        # The compiled selectors are keyed by node and must be recompiled.
+        # Frozen properties cannot be pickled either and are thawed.
+        all_properties = self._all_properties
+        if all_properties is None and self._frozen_properties is not None:
+            all_properties = self.get_all_properties()
+        return {"filename": self.filename,
+                "tree": element.to_tuple(self.rootnode),
+                "all_properties": all_properties}
+
+    def __setstate__(self, state):
+        self.__init__(state["filename"], element.from_tuple(state["tree"]))
+        self._all_properties = state["all_properties"]
+
+    @classmethod
+    def from_resolved(cls, filename, tree, all_properties):
+        """
+        Construct a device file from its tuple tree and the already resolved
+        properties of all its devices.
+        """
+        device_file = cls.__new__(cls)
+        device_file.__setstate__({"filename": filename, "tree": tree,
+                                  "all_properties": all_properties})
+        return device_file
+
     def _get_multi_device_identifier(self, node, naming_schema):
         properties = {k:v.split("|") for k,v in node.attrib.items()}
         return MultiDeviceIdentifier.from_product(properties, naming_schema)
 
-    def get_devices(self):
+    def get_devices(self, readonly=False, lazy=False):
         """
         Return a list of devices which are covered by this device file.
+
+        Args:
+            readonly: Return devices with frozen, copy-free property views.
+            lazy: Return devices that resolve each driver on first access.
         """
         device_node = self.rootnode.find('device')
         naming_schema_string = device_node.find('naming-schema').text
@@ -48,7 +130,40 @@ class DeviceFile:
             devices = [did for did in devices if did.string not in invalid_devices]
         if len(valid_devices):
             devices = [did for did in devices if did.string in valid_devices]
-        return [Device(did, self) for did in devices]
+        return [Device(did, self, readonly, lazy) for did in devices]
+
+    def get_device(self, partname, readonly=False, lazy=False):
+        """
+        Return the device with this partname by parsing the partname with the
+        naming schema instead of generating all devices of this file.
+
+        Returns:
+            the device or None if the partname is not covered by this file.
+        """
+        device_node = self.rootnode.find('device')
+        identifier = self._parse_partname(device_node,
+                                          device_node.find('naming-schema').text,
+                                          [node.text for node in device_node.iterfind(self._VALID_DEVICE)],
+                                          [node.text for node in device_node.iterfind(self._INVALID_DEVICE)],
+                                          partname)
+        if identifier is None:
+            return None
+        return Device(identifier, self, readonly, lazy)
+
+    @staticmethod
+    def _parse_partname(device_node, naming_schema, valid_devices, invalid_devices, partname):
+        """
+        Returns:
+            the DeviceIdentifier of the partname or None if it is not a valid
+            device of the device node.
+        """
+        alphabets = {k: v.split("|") for k, v in device_node.attrib.items()}
+        identifier = get_naming_schema(naming_schema).parser(alphabets).parse(partname)
+        if identifier is None or partname in invalid_devices:
+            return None
+        if len(valid_devices) and partname not in valid_devices:
+            return None
+        return identifier
 
     @staticmethod
     def is_valid(node, identifier: DeviceIdentifier):
@@ -63,58 +178,274 @@ class DeviceFile:
         properties = {k.replace(DeviceFile._PREFIX_ATTRIBUTE_DEVICE, ''):node.attrib[k].split("|") for k in device_keys}
         return not any(identifier[key] not in value for key, value in properties.items())
 
+    @staticmethod
+    def _is_ignored(node):
+        """
+        The identifier lists and the naming schema are not device properties.
+        """
+        return (node.getparent().getparent().getparent() is None and
+                node.getparent().tag == 'device' and
+                node.tag in (DeviceFile._VALID_DEVICE, DeviceFile._INVALID_DEVICE, 'naming-schema'))
+
+    @staticmethod
+    def _to_dict(tag, attrib, children):
+        """
+        Assemble the property dictionary of a node from its stripped
+        attributes and the dictionaries of its valid children.
+        `children` is None if the node has no valid children.
+        """
+        d = {tag: {} if len(attrib) else None}
+        if children is not None:
+            dd = defaultdict(list)
+            for dc in children:
+                for k, v in dc.items():
+                    dd[k].append(v)
+            dk = {}
+            for k, v in dd.items():
+                if k.startswith(DeviceFile._PREFIX_ATTRIBUTE):
+                    if len(v) > 1:
+                        raise ParserException("Attribute '{}' cannot be a list!".format(k))
+                    k = k.replace(DeviceFile._PREFIX_ATTRIBUTE, '')
+                    v = v[0]
+                dk[k] = v
+            d = {tag: dk}
+        if list(attrib.keys()) == ['value']:
+            d[tag] = attrib['value']
+        elif len(attrib):
+            if any(k in d[tag] for k in attrib.keys()):
+                raise ParserException("Node children are overwriting attribute '{}'!".format(k))
+            d[tag].update(attrib.items())
+        return d
+
+    def __compile_selectors(self):
+        """
+        Perform a lazy compilation of all device-* selectors of the tree into
+        bitmasks over the list of devices covered by this file.
+        """
+        if self._selectors is not None:
+            return
+        universe = DeviceIdentifierUniverse(device.identifier for device in self.get_devices())
+
+        selectors = {}
+        def compile_node(node):
+            mask = universe.mask
+            for key, value in node.attrib.items():
+                if key.startswith(DeviceFile._PREFIX_ATTRIBUTE_DEVICE):
+                    key = key.replace(DeviceFile._PREFIX_ATTRIBUTE_DEVICE, '')
+                    mask &= universe.select(key, value.split("|"))
+            if mask != universe.mask:
+                selectors[node] = mask
+            for child in node:
+                if isinstance(child.tag, str):
+                    compile_node(child)
+        compile_node(self.rootnode.find("device"))
+
+        self._identifiers = universe.ids
+        self._device_bits = {identifier: 1 << bit for bit, identifier in enumerate(universe.ids)}
+        self._universe = universe.mask
+        self._selectors = selectors
+
+    def _selector_mask(self, node):
+        """
+        Returns the bitmask of all devices for which the selectors of this
+        node match.
+        """
+        self.__compile_selectors()
+        return self._selectors.get(node, self._universe)
+
     def get_properties(self, identifier: DeviceIdentifier):
-        class Converter:
+        """
+        Resolve the property tree of a device covered by this file.
+
+        If all properties have already been resolved by `get_all_properties()`,
+        a copy of the shared property tree of the device is returned.
+        """
+        if self._frozen_properties is not None:
+            properties = self._frozen_properties.get(identifier.string)
+            if properties is not None:
+                return frozen.thaw(properties)
+        if self._all_properties is not None:
+            properties = self._all_properties.get(identifier.string)
+            if properties is not None:
+                return frozen.thaw(properties)
+        properties = self.__converter(identifier).to_dict(self.rootnode.find("device"))
+        return properties["device"]
+
+    def _get_shared_properties(self, identifier: DeviceIdentifier):
+        """
+        Same as `get_properties()`, but returns the property tree shared with
+        other devices if all properties have already been resolved.
+        The result must not be modified.
+        """
+        if self._all_properties is not None:
+            properties = self._all_properties.get(identifier.string)
+            if properties is not None:
+                return properties
+        return self.get_properties(identifier)
+
+    def get_frozen_properties(self, identifier: DeviceIdentifier):
+        """
+        Return the frozen property tree of a device covered by this file.
+
+        The tree is interned into the `interner` of this file, unless all
+        devices have already been interned by `get_all_frozen_properties()`.
+        """
+        if self._frozen_properties is not None:
+            properties = self._frozen_properties.get(identifier.string)
+            if properties is not None:
+                return properties
+        return self.interner.intern(self._get_shared_properties(identifier))
+
+    def __converter(self, identifier: DeviceIdentifier):
+        self.__compile_selectors()
+        selectors, universe = self._selectors, self._universe
+        device_bit = self._device_bits.get(identifier)
+
+        if device_bit is not None:
+            is_valid = lambda node: bool(selectors.get(node, universe) & device_bit)
+        else:
+            is_valid = None
+        return Converter(identifier, is_valid)
+
+    def get_driver_nodes(self, identifier: DeviceIdentifier):
+        """
+        Returns:
+            the top-level driver nodes of the device in the order of the
+            `driver` list of its properties.
+        """
+        converter = self.__converter(identifier)
+        return [node for node in self.rootnode.find("device").iterfind("driver")
+                if converter.is_valid(node)]
+
+    def get_driver_properties(self, identifier: DeviceIdentifier, node):
+        """
+        Resolve the properties of a single driver node of the device.
+        """
+        return self.__converter(identifier).to_dict(node)["driver"]
+
+    def get_all_properties(self):
+        """
+        Resolve the properties of all devices in this file in a single walk
+        of the tree instead of one walk per device.
+
+        Every node is evaluated against all devices at once using bitmasks
+        over the device list. Devices that resolve to the same subtree share
+        the same dictionary object, so the result must not be modified.
+        The result is cached and used by `get_properties()`.
+
+        Returns:
+            dictionary of device partname to property tree.
+        """
+        if self._all_properties is not None:
+            return self._all_properties
+        if self._frozen_properties is not None:
+            memo = {}
+            return {partname: frozen.thaw(properties, memo)
+                    for partname, properties in self._frozen_properties.items()}
+        self.__compile_selectors()
+        identifier_keys = self._identifiers[0].keys() if self._identifiers else []
+
+        def strip_attrib(node):
+            attrib = {k: v for k, v in node.attrib.items()
+                      if not k.startswith(DeviceFile._PREFIX_ATTRIBUTE_DEVICE)}
+            if node.getparent().getparent() is None and node.tag == 'device':
+                attrib = {k: v for k, v in attrib.items() if k not in identifier_keys}
+            return attrib
+
+        def walk(node, mask):
             """
+            Returns a list of (mask, dict) tuples, which partition the devices
+            in mask by their resolved subtree of this node.
             """
-            def __init__(self, identifier: DeviceIdentifier):
-                self.identifier = identifier
-
-            def is_valid(self, node):
-                ignored = [DeviceFile._VALID_DEVICE, DeviceFile._INVALID_DEVICE, 'naming-schema']
-                if (node.getparent().getparent().getparent() is None and
-                    node.getparent().tag == 'device' and
-                    node.tag in ignored):
-                    return False
-                return DeviceFile.is_valid(node, self.identifier)
-
-            def strip_attrib(self, node):
-                stripped_keys = filter(lambda k: not k.startswith(DeviceFile._PREFIX_ATTRIBUTE_DEVICE), node.attrib.keys())
-                if node.getparent().getparent() is None and node.tag == 'device':
-                    stripped_keys = filter(lambda k: k not in self.identifier.keys(), stripped_keys)
-                return {k:node.attrib[k] for k in stripped_keys}
-
-            def to_dict(self, t):
-                if isinstance(t, lxml.etree._Comment):
-                    # Remove comments in the XML file from the generated dict.
-                    return {}
-                attrib = self.strip_attrib(t)
-                d = {t.tag: {} if len(attrib) else None}
-                children = []
-                for c in t:
-                    if self.is_valid(c):
-                        children.append(c)
-                if children:
-                    dd = defaultdict(list)
-                    for dc in map(self.to_dict, children):
-                        for k, v in dc.items():
-                            dd[k].append(v)
-                    dk = {}
-                    for k, v in dd.items():
-                        if k.startswith(DeviceFile._PREFIX_ATTRIBUTE):
-                            if len(v) > 1:
-                                raise ParserException("Attribute '{}' cannot be a list!".format(k))
-                            k = k.replace(DeviceFile._PREFIX_ATTRIBUTE, '')
-                            v = v[0]
-                        dk[k] = v
-                    d = {t.tag: dk}
-                if list(attrib.keys()) == ['value']:
-                    d[t.tag] = attrib['value']
-                elif len(attrib):
-                    if any(k in d[t.tag] for k in attrib.keys()):
-                        raise ParserException("Node children are overwriting attribute '{}'!".format(k))
-                    d[t.tag].update(attrib.items())
-                return d
-
-        properties = Converter(identifier).to_dict(self.rootnode.find("device"))
-        return properties["device"]
+            attrib = strip_attrib(node)
+            has_children = False
+            partitions = [mask]
+            child_partitions = []
+            for child in node:
+                if not isinstance(child.tag, str):
+                    # Comments count as (empty) children
+                    has_children = True
+                    continue
+                if DeviceFile._is_ignored(child):
+                    continue
+                child_mask = mask & self._selector_mask(child)
+                if not child_mask:
+                    continue
+                has_children = True
+                parts = walk(child, child_mask)
+                child_partitions.append(parts)
+                # Split the devices by the subtree of this child
+                split = [m for m, _ in parts]
+                if child_mask != mask:
+                    split.append(mask & ~child_mask)
+                if len(split) > 1:
+                    partitions = [p & m for p in partitions for m in split if p & m]
+
+            result = []
+            for partition in partitions:
+                children = [d for parts in child_partitions for m, d in parts if m & partition]
+                children = children if has_children else None
+                result.append((partition, DeviceFile._to_dict(node.tag, attrib, children)))
+            return result
+
+        properties = {}
+        for mask, d in walk(self.rootnode.find("device"), self._universe):
+            for bit, identifier in enumerate(self._identifiers):
+                if mask & (1 << bit):
+                    properties[identifier.string] = d["device"]
+        self._all_properties = properties
+        return properties
+
+    def get_all_frozen_properties(self, interner=None):
+        """
+        Resolve the properties of all devices in this file and hash-cons them
+        into frozen trees, so that equal subtrees (e.g. the same driver of
+        many devices) are stored only once, also across device files.
+
+        The mutable trees of `get_all_properties()` are released afterwards,
+        `get_properties()` then returns thawed copies of the frozen trees.
+
+        Args:
+            interner: The `frozen.Interner` to use, defaults to the interner
+                of this file. Pass the same interner to several files to
+                share their subtrees, it then also becomes their `interner`.
+
+        Returns:
+            dictionary of device partname to frozen property tree.
+        """
+        if self._frozen_properties is None:
+            if interner is not None:
+                self.interner = interner
+            memo = {}
+            self._frozen_properties = {partname: self.interner.intern(properties, memo)
+                                       for partname, properties in self.get_all_properties().items()}
+            self._all_properties = None
+        return self._frozen_properties
+
+    def get_fingerprints(self, driver=None, ignore=()):
+        """
+        Compute the fingerprints of all devices in this file at once, see
+        `Device.fingerprint()` and `Device.driver_fingerprint()`.
+        The properties are interned via `get_all_frozen_properties()`, so that
+        subtrees shared by several devices are hashed only once.
+
+        Args:
+            driver: Fingerprint only the drivers matching this name.
+            ignore: Property keys whose subtrees are ignored, only used
+                without driver, see `Device.fingerprint()`.
+
+        Returns:
+            dictionary of device partname to hex digest.
+        """
+        self.get_all_frozen_properties()
+        devices = self.get_devices(readonly=True)
+        if driver is None:
+            return {device.partname: device.fingerprint(ignore) for device in devices}
+        return {device.partname: device.driver_fingerprint(driver) for device in devices}
+
+    def get_equivalence_classes(self, ignore=()):
+        """
+        Group the devices of this file by their resolved properties,
+        see `equivalence.group_devices()`.
+        """
+        return group_devices([self], ignore)
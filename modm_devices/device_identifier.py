@@ -5,39 +5,62 @@
 # All rights reserved.
 
 import re
-import logging
-import copy
+import sys
 import itertools
-import string
 
-from collections import OrderedDict, defaultdict
+from collections import defaultdict
 from .exception import DeviceIdentifierException
+from .naming_schema import get_naming_schema
 
 class DeviceIdentifier:
+    """ DeviceIdentifier
+    Ordered key-value properties of a device, formatted by a naming schema.
+
+    The properties are stored as immutable tuples of interned strings, which
+    are shared between copies until one of them is modified.
+    """
+    __slots__ = ("_naming_schema", "_keys", "_values", "__string", "__ustring", "__hash")
+
     def __init__(self, naming_schema=None):
-        self.naming_schema = naming_schema
-        self._properties = OrderedDict()
+        self._naming_schema = naming_schema
+        self._keys = ()
+        self._values = ()
         self.__string = None
         self.__ustring = None
         self.__hash = None
 
+    def __invalidate(self):
+        self.__hash = None
+        self.__string = None
+        self.__ustring = None
+
+    @property
+    def naming_schema(self):
+        return self._naming_schema
+
+    @naming_schema.setter
+    def naming_schema(self, naming_schema):
+        self.__invalidate()
+        self._naming_schema = naming_schema
+
     @property
     def _ustring(self):
         if self.__ustring is None:
-            self.__ustring = "".join([k + self._properties[k] for k in sorted(self._properties.keys())])
+            self.__ustring = "".join([k + self._values[self._keys.index(k)] for k in sorted(self._keys)])
             if self.naming_schema: self.__ustring += self.naming_schema;
         return self.__ustring
 
     def copy(self):
-        identifier = DeviceIdentifier(self.naming_schema)
-        identifier._properties = copy.deepcopy(self._properties)
+        identifier = DeviceIdentifier(self._naming_schema)
+        identifier._keys = self._keys
+        identifier._values = self._values
         identifier.__string = self.__string
         identifier.__ustring = self.__ustring
         identifier.__hash = self.__hash
         return identifier
 
     def keys(self):
-        return self._properties.keys()
+        return self._keys
 
     @property
     def string(self):
@@ -46,23 +69,37 @@ class DeviceIdentifier:
             raise DeviceIdentifierException("Naming schema is missing!")
         # Use the naming schema to generate the string
         if self.__string is None:
-            self.__string = string.Formatter().vformat(
-                    self.naming_schema, (), defaultdict(str, **self._properties))
+            self.__string = get_naming_schema(self.naming_schema).format(self._keys, self._values)
         return self.__string
 
     def set(self, key, value):
-        self.__hash = None
-        self.__string = None
-        self.__ustring = None
-        self._properties[key] = value
+        self.__invalidate()
+        key = sys.intern(key)
+        if isinstance(value, str):
+            value = sys.intern(value)
+        if key in self._keys:
+            index = self._keys.index(key)
+            self._values = self._values[:index] + (value,) + self._values[index + 1:]
+        else:
+            self._keys += (key,)
+            self._values += (value,)
 
     def get(self, key, default=None):
-        return self._properties.get(key, default)
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            return default
 
     def __getitem__(self, key):
-        return self.get(key, None)
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            return None
 
     def __getattr__(self, attr):
+        if attr.startswith("_"):
+            # Private attributes are never properties (required for pickle)
+            raise AttributeError(attr)
         val = self.get(attr, None)
         if val is None:
             raise AttributeError("'{}' has no property '{}'".format(repr(self), attr))
@@ -92,24 +129,49 @@ class MultiDeviceIdentifier:
     This manages filtering, merging and accessing.
     """
     def __init__(self, objs=None):
-        self._ids = []
-        self.__string = None
-        self.__naming_schema = None
-        self.__dirty = True
-
+        ids = []
         if isinstance(objs, DeviceIdentifier):
-            self._ids = [objs.copy()]
+            ids = [objs.copy()]
         if isinstance(objs, (list, set, tuple)):
             for obj in objs:
                 if isinstance(objs, DeviceIdentifier):
-                    self._ids.append(objs)
+                    ids.append(objs)
         if isinstance(objs, MultiDeviceIdentifier):
-            self._ids = [dev for dev in objs.ids]
+            ids = [dev for dev in objs.ids]
+        self._reset(ids)
+
+    def _reset(self, ids):
+        """
+        Replace all identifiers and rebuild the key and value index.
+        """
+        self._ids = []
+        self._unique = set()
+        # Count of unique identifiers per key and value in insertion order
+        self._values = {}
+        self._invalidate()
+        for did in ids:
+            self._add(did)
+
+    def _invalidate(self):
+        self.__dirty = True
+        self.__string = None
+        self.__naming_schema = None
+        self.__keys = None
+        self.__attributes = {}
+
+    def _add(self, did):
+        self._ids.append(did)
+        if did not in self._unique:
+            self._unique.add(did)
+            for k in did.keys():
+                values = self._values.setdefault(k, {})
+                v = did[k]
+                values[v] = values.get(v, 0) + 1
 
     @property
     def ids(self):
         if self.__dirty:
-            self._ids = sorted(list(set(self._ids)), key=lambda d: d._ustring)
+            self._ids = sorted(self._unique, key=lambda d: d._ustring)
             self.__dirty = False
         return self._ids
 
@@ -123,24 +185,21 @@ class MultiDeviceIdentifier:
     @staticmethod
     def from_list(device_ids: list):
         mid = MultiDeviceIdentifier()
-        mid._ids = [dev for dev in device_ids]
+        mid._reset(device_ids)
         return mid
 
     def append(self, did):
         assert isinstance(did, DeviceIdentifier)
 
-        self._ids.append(did)
-        self.__dirty = True
-        self.__string = None
-        self.__naming_schema = None
+        self._add(did)
+        self._invalidate()
 
     def extend(self, dids):
         assert isinstance(dids, (MultiDeviceIdentifier, list))
 
-        self._ids.extend(dids)
-        self.__dirty = True
-        self.__string = None
-        self.__naming_schema = None
+        for did in dids:
+            self._add(did)
+        self._invalidate()
 
     @property
     def string(self):
@@ -165,7 +224,7 @@ class MultiDeviceIdentifier:
             if me != other:
                 for m in me:
                     ident = DeviceIdentifier(self.naming_schema)
-                    ident[k] = m
+                    ident.set(k, m)
                     ids.append(ident)
         return ids
 
@@ -183,15 +242,48 @@ class MultiDeviceIdentifier:
             ids.append(ident)
         return ids
 
+    def _value_set(self, key):
+        """
+        Returns the set of all values of this key, including None if not all
+        identifiers have this key.
+        """
+        values = self._values.get(key, {})
+        if sum(values.values()) < len(self._unique):
+            return set(values) | {None}
+        return set(values)
+
+    @staticmethod
+    def _value_masks(universe, keys):
+        """
+        Returns the bitmask of the identifiers in the universe per key and
+        value, including the None value for identifiers without this key.
+        """
+        masks = {k: defaultdict(int) for k in keys}
+        for bit, did in enumerate(universe.ids):
+            for k in keys:
+                masks[k][did[k]] |= 1 << bit
+        return masks
+
     def minimal_subtract(self, complete, others):
         assert isinstance(complete, MultiDeviceIdentifier)
 
         def minimal_keys(absolute, diff):
             keys = diff.keys()
+            universe = DeviceIdentifierUniverse(complete.ids)
+            masks = MultiDeviceIdentifier._value_masks(universe, keys)
+            # the bitmasks of all identifiers matching any value of the diff
+            selected = {k: sum(masks[k].get(v, 0) for v in diff.getAttribute(k)) for k in keys}
+            try:
+                absolute_mask = universe.bitmask(absolute)
+            except DeviceIdentifierException:
+                # the filtered identifiers can never be equal to absolute
+                return keys
             for clength in range(len(keys)):
                 for kcomb in itertools.combinations(keys, clength):
-                    filtered = complete.filter(lambda i: any(i[k] in diff.getAttribute(k) for k in kcomb))
-                    if filtered == absolute:
+                    filtered = 0
+                    for k in kcomb:
+                        filtered |= selected[k]
+                    if filtered == absolute_mask:
                         return kcomb
             return keys
 
@@ -210,27 +302,51 @@ class MultiDeviceIdentifier:
         if (len(self.ids) * 2 > len(complete.ids)):
             # invert it
             ids_inv = complete.copy()
-            ids_inv.__string = None
-            ids_inv._ids = [did for did in ids_inv.ids if did not in self.ids]
+            ids_inv._reset([did for did in ids_inv.ids if did not in self.ids])
             return (ids_inv.minimal_subtract(complete, others), -1)
         else:
             return (self.minimal_subtract(complete, others), 1)
 
     def minimal_subtract_set(self, complete, parent):
+        """
+        Returns the minimal list of selectors which select these identifiers
+        out of the complete identifiers.
+
+        The keys are searched in the same order as an exhaustive search over
+        all key combinations, however, each combination is checked using the
+        bitmasks of the identifiers per key and value.
+        """
         assert isinstance(complete, MultiDeviceIdentifier)
 
-        def partly_inside(mkeys, ids, did):
-            return any( all( cid[k] == did[k] for k in mkeys ) for cid in ids )
-
         def minimal_keys():
-            keys = [k for k in self.keys() if not all( all(s[k] == p[k] for p in parent) for s in self)]
+            # keys for which not all our identifiers have the same value as the parent
+            keys = [k for k in self.keys()
+                    if len(self) and len(parent) and
+                       not (len(self._value_set(k)) == 1 and
+                            self._value_set(k) == parent._value_set(k))]
+            universe = DeviceIdentifierUniverse(complete.ids)
+            try:
+                self_mask = universe.bitmask(self)
+            except DeviceIdentifierException:
+                self_mask = None
+            masks = MultiDeviceIdentifier._value_masks(universe, keys)
             for clength in range(len(keys)):
                 for kcomb in itertools.combinations(keys, clength):
                     if not clength:
-                        filtered = parent
-                    else:
-                        filtered = complete.filter(lambda i: partly_inside(kcomb, self, i))
-                    if filtered == self:
+                        if parent == self:
+                            return kcomb
+                        continue
+                    if self_mask is None:
+                        # complete does not contain all identifiers
+                        continue
+                    # all identifiers which match any of our projections
+                    filtered = 0
+                    for values in set(tuple(did[k] for k in kcomb) for did in self):
+                        mask = universe.mask
+                        for k, v in zip(kcomb, values):
+                            mask &= masks[k][v]
+                        filtered |= mask
+                    if filtered == self_mask:
                         return kcomb
             return keys
 
@@ -243,43 +359,68 @@ class MultiDeviceIdentifier:
                     nids.append(ident)
             return nids
 
-        def product_inside(mkeys, ids, did):
-            nids = ids.copy()
-            nids.append(did)
-            pids = filtered_by_keys(mkeys, nids).product()
-            return all( partly_inside(mkeys, self, i) for i in pids )
-
         mkeys = minimal_keys()
+        projections = set(tuple(did[k] for k in mkeys) for did in self)
+
+        def product_inside(values, did):
+            """
+            Checks if the product of the group values extended by the values
+            of did is still covered by our projections. Since the product
+            of the group itself is covered, only the new combinations are
+            checked.
+            """
+            new = [ii for ii, k in enumerate(mkeys) if did[k] not in values[ii]]
+            for jj, first in enumerate(new):
+                choices = []
+                for ii, k in enumerate(mkeys):
+                    if ii == first:
+                        choices.append([did[k]])
+                    elif ii in new[:jj]:
+                        choices.append(values[ii])
+                    else:
+                        choices.append(values[ii] | {did[k]})
+                if not all(p in projections for p in itertools.product(*choices)):
+                    return False
+            return True
 
-        cids = [ MultiDeviceIdentifier() ]
+        cids = []
         for did in self:
-            for ids in cids:
-                if product_inside(mkeys, ids, did):
+            for ids, values in cids:
+                if product_inside(values, did):
                     ids.append(did)
+                    for ii, k in enumerate(mkeys):
+                        values[ii].add(did[k])
                     break
             else:
-                cids.append( MultiDeviceIdentifier(did) )
+                cids.append( (MultiDeviceIdentifier(did), [{did[k]} for k in mkeys]) )
+        if not cids:
+            cids.append( (MultiDeviceIdentifier(), []) )
 
-        fids = [filtered_by_keys(mkeys, ids) for ids in cids]
+        fids = [filtered_by_keys(mkeys, ids) for ids, _ in cids]
         fids.sort(key=lambda d: d.string)
         return fids
 
     def filter(self, filter_fn):
-        ids = MultiDeviceIdentifier()
+        return MultiDeviceIdentifier.from_list([did for did in self.ids if filter_fn(did)])
 
-        for did in self.ids:
-            if filter_fn(did):
-                ids.append(did)
-
-        return ids
+    def bitset(self, universe):
+        """
+        Returns these identifiers as bitmask over the universe.
+        """
+        return universe.bitset(self)
 
     def keys(self):
-        keys = []
-        for ident in self.ids:
-            for k in ident.keys():
-                if k not in keys:
-                    keys.append(k)
-        return keys
+        if self.__keys is None:
+            # Keys in order of their first appearance in the sorted identifiers
+            keys = []
+            for ident in self.ids:
+                if len(keys) == len(self._values):
+                    break
+                for k in ident.keys():
+                    if k not in keys:
+                        keys.append(k)
+            self.__keys = keys
+        return list(self.__keys)
 
     def items(self):
         items = {}
@@ -302,16 +443,31 @@ class MultiDeviceIdentifier:
 
     def remove(self, device_id):
         self.ids.remove(device_id)
+        self._unique.remove(device_id)
+        for k in device_id.keys():
+            values = self._values[k]
+            v = device_id[k]
+            values[v] -= 1
+            if not values[v]:
+                del values[v]
+            if not values:
+                del self._values[k]
+        self.__string = None
+        self.__naming_schema = None
+        self.__keys = None
+        self.__attributes = {}
 
     def __contains__(self, other):
         if isinstance(other, DeviceIdentifier):
-            return any(other == dev for dev in self.ids)
+            return other in self._unique
         if isinstance(other, MultiDeviceIdentifier):
-            return all(did in self for did in other)
+            return other._unique <= self._unique
         return NotImplemented
 
     def __eq__(self, others):
-        return set(others.ids) == set(self.ids)
+        if not isinstance(others, MultiDeviceIdentifier):
+            return NotImplemented
+        return others._unique == self._unique
 
     def __iter__(self):
         for device_id in self.ids:
@@ -327,21 +483,167 @@ class MultiDeviceIdentifier:
         return sum(hash(did) for did in self.ids)
 
     def getAttribute(self, name):
-        if '@' in name:
-            attr = [getattr(i, name[1:]) for i in self.ids]
-        else:
-            attr = [i[name] for i in self.ids]
+        attr = self.__attributes.get(name)
+        if attr is None:
+            if '@' in name:
+                attr = set(getattr(i, name[1:]) for i in self.ids)
+            else:
+                attr = self._values.get(name, {}).keys()
 
-        attr = [a for a in attr if a is not None]
-        attr = list(set(attr))
-        try:
-            attr.sort(key=int)
-        except:
-            attr.sort()
-        return attr
+            attr = [a for a in attr if a is not None]
+            try:
+                attr.sort(key=int)
+            except:
+                attr.sort()
+            self.__attributes[name] = attr
+        return list(attr)
 
     def __str__(self):
         return self.string
 
     def __repr__(self):
-        return self.string
\ No newline at end of file
+        return self.string
+
+
+class DeviceIdentifierUniverse:
+    """ DeviceIdentifierUniverse
+    Indexed list of DeviceIdentifier, over which sets of identifiers can be
+    represented as integer bitmasks (see DeviceIdentifierSet).
+    """
+    def __init__(self, ids):
+        self.ids = []
+        self._index = {}
+        for did in ids:
+            if did not in self._index:
+                self._index[did] = len(self.ids)
+                self.ids.append(did)
+        self.mask = (1 << len(self.ids)) - 1
+        self.__values = None
+
+    def index(self, did):
+        try:
+            return self._index[did]
+        except KeyError:
+            raise DeviceIdentifierException("'{}' is not part of the universe!".format(repr(did)))
+
+    def bitmask(self, ids):
+        mask = 0
+        for did in ids:
+            mask |= 1 << self.index(did)
+        return mask
+
+    def bitset(self, ids=()):
+        return DeviceIdentifierSet(self, self.bitmask(ids))
+
+    def select(self, key, values):
+        """
+        Returns the bitmask of all identifiers whose key has one of the values.
+        """
+        if self.__values is None:
+            # Lazily build the bitmask per key and value
+            self.__values = defaultdict(lambda: defaultdict(int))
+            for bit, did in enumerate(self.ids):
+                for k in did.keys():
+                    self.__values[k][did[k]] |= 1 << bit
+        masks = self.__values.get(key, {})
+        return sum(masks.get(v, 0) for v in set(values))
+
+    def to_list(self, mask):
+        ids = []
+        bit = 0
+        while mask:
+            if mask & 1:
+                ids.append(self.ids[bit])
+            mask >>= 1
+            bit += 1
+        return ids
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class DeviceIdentifierSet:
+    """ DeviceIdentifierSet
+    Set of DeviceIdentifier stored as bitmask over a DeviceIdentifierUniverse.
+    All set operations are integer operations on the bitmasks.
+    """
+    __slots__ = ("universe", "mask")
+
+    def __init__(self, universe, mask=0):
+        self.universe = universe
+        self.mask = mask
+
+    @staticmethod
+    def from_multi(universe, ids):
+        return DeviceIdentifierSet(universe, universe.bitmask(ids))
+
+    def to_multi(self):
+        return MultiDeviceIdentifier.from_list(self.universe.to_list(self.mask))
+
+    def __mask(self, other):
+        if isinstance(other, DeviceIdentifierSet):
+            assert other.universe is self.universe
+            return other.mask
+        return self.universe.bitmask(other)
+
+    def __or__(self, other):
+        return DeviceIdentifierSet(self.universe, self.mask | self.__mask(other))
+
+    def __and__(self, other):
+        return DeviceIdentifierSet(self.universe, self.mask & self.__mask(other))
+
+    def __sub__(self, other):
+        return DeviceIdentifierSet(self.universe, self.mask & ~self.__mask(other))
+
+    def __xor__(self, other):
+        return DeviceIdentifierSet(self.universe, self.mask ^ self.__mask(other))
+
+    def __invert__(self):
+        return DeviceIdentifierSet(self.universe, self.universe.mask & ~self.mask)
+
+    def __contains__(self, other):
+        if isinstance(other, DeviceIdentifier):
+            other = [other]
+        try:
+            mask = self.__mask(other)
+        except DeviceIdentifierException:
+            return False
+        return mask & self.mask == mask
+
+    def __eq__(self, other):
+        if not isinstance(other, (DeviceIdentifierSet, MultiDeviceIdentifier)):
+            try:
+                iter(other)
+            except TypeError:
+                return NotImplemented
+        try:
+            return self.mask == self.__mask(other)
+        except DeviceIdentifierException:
+            return False
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __le__(self, other):
+        return self.mask & ~self.__mask(other) == 0
+
+    def __ge__(self, other):
+        mask = self.__mask(other)
+        return mask & self.mask == mask
+
+    def __hash__(self):
+        # Same hash as the equal MultiDeviceIdentifier
+        return sum(hash(did) for did in self)
+
+    def __bool__(self):
+        return bool(self.mask)
+
+    def __len__(self):
+        return bin(self.mask).count("1")
+
+    def __iter__(self):
+        return iter(self.universe.to_list(self.mask))
+
+    def __repr__(self):
+        return "DeviceIdentifierSet({})".format(", ".join(repr(did) for did in self))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lightweight element tree for device files.
+
+Implements the small subset of the lxml element API that `DeviceFile` uses,
+so that a device file can be restored from a compact tuple serialization
+without going through lxml again.
+"""
+
+import sys
+
+
+class Element:
+    __slots__ = ("tag", "attrib", "text", "_children", "_parent", "_pending")
+
+    def __init__(self, tag, attrib=None, text=None, parent=None):
+        self.tag = tag
+        self.attrib = {} if attrib is None else attrib
+        self.text = text
+        self._children = []
+        self._parent = parent
+        self._pending = None
+
+    @property
+    def children(self):
+        # Children restored from a tuple are only created on first access
+        if self._pending is not None:
+            self._children = [from_tuple(child, self) for child in self._pending]
+            self._pending = None
+        return self._children
+
+    def getparent(self):
+        return self._parent
+
+    def get(self, key, default=None):
+        return self.attrib.get(key, default)
+
+    def find(self, tag):
+        return next(self.iterfind(tag), None)
+
+    def iterfind(self, tag):
+        return (child for child in self.children if child.tag == tag)
+
+    def __iter__(self):
+        return iter(self.children)
+
+    def __len__(self):
+        return len(self.children)
+
+    def __repr__(self):
+        return "<Element {}>".format(self.tag)
+
+
+def to_tuple(node):
+    """
+    Convert an element (sub-)tree into nested tuples of strings.
+    Comments, processing instructions and the whitespace text of inner nodes
+    are dropped, since they do not contribute to the device properties.
+    """
+    attrib = tuple(sys.intern(s) for item in node.attrib.items() for s in item)
+    children = tuple(to_tuple(child) for child in node if isinstance(child.tag, str))
+    text = None if children else node.text
+    return (sys.intern(node.tag), attrib, text, children)
+
+
+def from_tuple(data, parent=None):
+    """
+    Restore an element (sub-)tree from its tuple representation.
+    """
+    tag, attrib, text, children = data
+    node = Element(tag, dict(zip(attrib[::2], attrib[1::2])), text, parent)
+    if children:
+        node._pending = children
+    return node
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Equivalence classes of devices with identical resolved properties.
+
+Devices are grouped by the fingerprint of their property tree, so that
+e.g. the temperature variants of a device end up in the same class.
+Chosen subtrees like the `package` pinout can be ignored, so that also the
+package variants are grouped together.
+"""
+
+from . import pkg
+
+
+def group_devices(device_files, ignore=()):
+    """
+    Group the devices of the device files by their resolved properties.
+
+    Args:
+        ignore: Property keys whose subtrees are ignored at any depth.
+
+    Returns:
+        list of equivalence classes, each a naturally sorted list of
+        partnames, sorted by their first partname, which can be used as the
+        representative of the class.
+    """
+    classes = {}
+    for device_file in device_files:
+        for partname, fingerprint in device_file.get_fingerprints(ignore=ignore).items():
+            classes.setdefault(fingerprint, []).append(partname)
+    classes = [sorted(partnames, key=pkg.naturalkey) for partnames in classes.values()]
+    return sorted(classes, key=lambda partnames: pkg.naturalkey(partnames[0]))
+
+
+def find_equivalence_classes(filenames=None, parser=None, ignore=()):
+    """
+    Parse the device files, by default all bundled ones, and group all their
+    devices by their resolved properties, see `group_devices()`.
+    """
+    from .parser import DeviceParser
+    if filenames is None:
+        filenames = list(pkg.iter_device_files())
+    parser = parser or DeviceParser()
+    return group_devices(parser.parse_all(filenames), ignore)
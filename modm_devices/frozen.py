@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Immutable views of device property trees.
+
+Dictionaries are wrapped as read-only mappings and lists are converted to
+tuples, so that a frozen tree can be handed out without copying it.
+Trees are frozen by an `Interner`, which also shares equal subtrees.
+"""
+
+import sys
+import hashlib
+from types import MappingProxyType
+from collections.abc import Mapping
+
+
+def thaw(obj, memo=None):
+    """
+    Return a mutable deep copy of a (frozen) property tree.
+    If a memo dictionary is passed, shared subtrees stay shared in the copy.
+    """
+    if isinstance(obj, (Mapping, tuple, list)):
+        if memo is not None and id(obj) in memo:
+            return memo[id(obj)][1]
+        if isinstance(obj, Mapping):
+            thawed = {k: thaw(v, memo) for k, v in obj.items()}
+        else:
+            thawed = [thaw(v, memo) for v in obj]
+        if memo is not None:
+            memo[id(obj)] = (obj, thawed)
+        return thawed
+    return obj
+
+
+class Interner:
+    """
+    Hash-consing of frozen property trees.
+
+    Equal subtrees are frozen only once and then shared by all trees interned
+    into the same interner, also across device files.
+    The interned subtrees are kept alive by the interner, until it is freed or
+    `clear()` is called. Every `DeviceFile` owns an interner by default, so
+    that its trees are freed with it.
+    """
+    def __init__(self):
+        self._table = {}
+        # ids of all interned subtrees, whose digests may be memoized
+        self._interned = set()
+        self._digests = {}
+
+    def __len__(self):
+        return len(self._table)
+
+    def clear(self):
+        self._table.clear()
+        self._interned.clear()
+        self._digests.clear()
+
+    def intern(self, obj, memo=None):
+        """
+        Return the shared, immutable copy of the property tree.
+        """
+        if memo is None:
+            memo = {}
+        if isinstance(obj, (dict, list)):
+            if id(obj) in memo:
+                return memo[id(obj)][1]
+            if isinstance(obj, dict):
+                items = tuple((sys.intern(k), self.intern(v, memo)) for k, v in obj.items())
+                key = (dict, tuple((k, _key(v)) for k, v in items))
+            else:
+                items = tuple(self.intern(v, memo) for v in obj)
+                key = (list, tuple(_key(v) for v in items))
+            frozen = self._table.get(key)
+            if frozen is None:
+                frozen = MappingProxyType(dict(items)) if key[0] is dict else items
+                self._table[key] = frozen
+                self._interned.add(id(frozen))
+            memo[id(obj)] = (obj, frozen)
+            return frozen
+        if isinstance(obj, str):
+            return sys.intern(obj)
+        return obj
+
+    def fingerprint(self, obj, ignore=()):
+        """
+        Return the `fingerprint()` of the property tree.
+
+        The digests of subtrees interned into this interner are memoized.
+        Other trees are hashed without interning them.
+        """
+        ignore = frozenset(ignore)
+        return _digest(obj, ignore, {}, self._digests.setdefault(ignore, {}),
+                       self._interned).hex()
+
+
+def fingerprint(obj, ignore=()):
+    """
+    Return a stable SHA-256 hex digest of the content of the property tree.
+
+    The digest does not depend on the order of dictionary keys, since that is
+    the order of the XML attributes, but it does on the order of lists. It is
+    the same across processes and Python versions and for frozen and mutable
+    trees of the same content.
+
+    Args:
+        ignore: Dictionary keys, whose subtrees are left out at any depth.
+    """
+    return _digest(obj, frozenset(ignore), {}).hex()
+
+
+def _digest(obj, ignore, memo, digests=None, interned=()):
+    """
+    Subtrees shared in the tree are only hashed once via the memo of this
+    call, the digests of interned subtrees are stored in `digests`.
+    """
+    if not isinstance(obj, (Mapping, tuple, list)):
+        return hashlib.sha256(_encode(obj)).digest()
+    cache = digests if id(obj) in interned else memo
+    value = cache.get(id(obj))
+    if value is not None:
+        return value
+    digest = hashlib.sha256()
+    if isinstance(obj, Mapping):
+        keys = sorted(key for key in obj if key not in ignore)
+        digest.update(b"d%d:" % len(keys))
+        for key in keys:
+            digest.update(_encode(key))
+            _update(digest, obj[key], ignore, memo, digests, interned)
+    else:
+        digest.update(b"l%d:" % len(obj))
+        for value in obj:
+            _update(digest, value, ignore, memo, digests, interned)
+    cache[id(obj)] = digest.digest()
+    return cache[id(obj)]
+
+
+def _update(digest, value, ignore, memo, digests, interned):
+    if isinstance(value, (Mapping, tuple, list)):
+        digest.update(b"h" + _digest(value, ignore, memo, digests, interned))
+    else:
+        digest.update(_encode(value))
+
+
+def _encode(value):
+    if value is None:
+        return b"n"
+    value = str(value).encode("utf-8")
+    return b"s%d:" % len(value) + value
+
+
+def _key(value):
+    # Interned subtrees are unique, so they are compared by identity
+    if isinstance(value, (MappingProxyType, tuple)):
+        return id(value)
+    return (value,)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prebuilt index of all device identifiers.
+
+The index maps every valid identifier string to the device file covering it,
+so that a single device can be looked up without parsing the whole database.
+It is stored as `index.json` in the root of the devices folder and must be
+regenerated whenever the device files change.
+"""
+
+import os
+import re
+import json
+import bisect
+import fnmatch
+import functools
+
+from . import pkg
+
+INDEX_FILENAME = "index.json"
+INDEX_VERSION = 1
+
+_index = None
+_partnames = None
+
+
+def devices_path():
+    return pkg.get_filename('modm_devices', 'resources/devices')
+
+
+def _relpath(filename, root):
+    return os.path.relpath(os.path.abspath(str(filename)), os.path.abspath(root)).replace(os.sep, "/")
+
+
+def _add_to_index(index, filenames, root, parser):
+    for filename in filenames:
+        path = _relpath(filename, root)
+        devices = parser.parse(str(filename)).get_devices()
+        index["files"][path] = devices[0].naming_schema
+        for device in devices:
+            index["devices"][device.partname] = path
+
+
+def build_index(root=None):
+    """
+    Parse all device files below `root` and return the index data.
+    """
+    from .parser import DeviceParser
+    root = root or devices_path()
+    filenames = list(pkg.iter_device_files(root))
+    index = {"version": INDEX_VERSION, "files": {}, "devices": {}}
+    _add_to_index(index, filenames, root, DeviceParser())
+    return index
+
+
+def update_index(filenames, root=None):
+    """
+    Update the index file in `root` with the devices of the given device files.
+    Entries of these files and of files that no longer exist are replaced.
+
+    This is a read-modify-write of the index file, which must not run
+    concurrently with other updates or while device files are regenerated.
+    After generating device files in parallel, rebuild the index once with
+    `make index` instead.
+    """
+    from .parser import DeviceParser
+    root = root or devices_path()
+    index = read_index(root)
+    if index is None:
+        index = build_index(root)
+    else:
+        paths = {_relpath(f, root) for f in filenames}
+        stale = {p for p in index["files"]
+                 if p in paths or not os.path.exists(os.path.join(root, p))}
+        index["files"] = {p: s for p, s in index["files"].items() if p not in stale}
+        index["devices"] = {d: p for d, p in index["devices"].items() if p not in stale}
+        _add_to_index(index, filenames, root, DeviceParser())
+    write_index(index, root)
+    return index
+
+
+def write_index(index, root=None):
+    """
+    Write the index file atomically, so that concurrent readers never see a
+    partially written index.
+    """
+    global _index, _partnames
+    root = root or devices_path()
+    filename = os.path.join(root, INDEX_FILENAME)
+    tmpname = "{}.{}.tmp".format(filename, os.getpid())
+    try:
+        with open(tmpname, "w") as index_file:
+            json.dump(index, index_file, indent=1, sort_keys=True)
+            index_file.write("\n")
+        os.replace(tmpname, filename)
+    except OSError:
+        if os.path.exists(tmpname):
+            os.unlink(tmpname)
+        raise
+    _index = None
+    _partnames = None
+
+
+def read_index(root=None):
+    root = root or devices_path()
+    try:
+        with open(os.path.join(root, INDEX_FILENAME)) as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def get_index():
+    """
+    Return the index of the bundled device files.
+    If the index file is missing, it is built in memory once.
+    """
+    global _index
+    if _index is None:
+        _index = read_index() or build_index()
+    return _index
+
+
+def find_device_file(partname):
+    """
+    Return the filename of the device file covering the partname or None.
+    """
+    path = get_index()["devices"].get(partname.lower())
+    if path is None:
+        return None
+    return os.path.join(devices_path(), *path.split("/"))
+
+
+def find_device(partname, parser=None):
+    """
+    Return the `Device` with this partname by parsing only its device file.
+
+    Returns:
+        the device or None if the partname is unknown.
+    """
+    filename = find_device_file(partname)
+    if filename is None:
+        return None
+    if parser is None:
+        from .parser import DeviceParser
+        parser = DeviceParser()
+    return parser.parse(filename).get_device(partname.lower())
+
+
+def get_partnames():
+    """
+    Return the sorted list of all partnames of the bundled device files.
+    """
+    global _partnames
+    if _partnames is None:
+        _partnames = sorted(get_index()["devices"])
+    return _partnames
+
+
+def find_devices(pattern):
+    """
+    Return the sorted partnames matching the shell-style wildcard pattern,
+    e.g. `stm32f4*` or `atmega32?`.
+
+    Only the partnames starting with the literal prefix of the pattern are
+    matched against it, which are found by bisection.
+    """
+    pattern = pattern.lower()
+    prefix = pattern
+    for position, char in enumerate(pattern):
+        if char in "*?[":
+            prefix = pattern[:position]
+            break
+    partnames = get_partnames()
+    start = bisect.bisect_left(partnames, prefix)
+    end = bisect.bisect_left(partnames, prefix + "\U0010ffff", start)
+    if prefix == pattern:
+        return partnames[start:start + 1] if start < end and partnames[start] == pattern else []
+    if pattern == prefix + "*":
+        return partnames[start:end]
+    match = _compile_pattern(pattern)
+    return [p for p in partnames[start:end] if match(p)]
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_pattern(pattern):
+    return re.compile(fnmatch.translate(pattern)).match
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compiled naming schemas.
+
+A naming schema like `{platform}{family}{name}{pin}{size}{package}` is split
+into its literals and fields once, which makes formatting a partname a simple
+join. Together with the values a device file allows for every key, a schema
+also compiles into a regular expression that parses a partname back into its
+DeviceIdentifier.
+"""
+
+import re
+import string
+import functools
+
+from collections import defaultdict
+from .exception import DeviceIdentifierException
+
+
+class NamingSchema:
+    def __init__(self, schema):
+        self.schema = schema
+        self._parts = []
+        self._simple = True
+        for literal, field, spec, conversion in string.Formatter().parse(schema):
+            if spec or conversion:
+                self._simple = False
+            self._parts.append((literal, field))
+        self.fields = tuple(field for _, field in self._parts if field is not None)
+
+    def format(self, keys, values):
+        """
+        Return the partname of the identifier given by its keys and values.
+        Keys missing from the identifier are formatted as empty strings.
+        """
+        if not self._simple:
+            return string.Formatter().vformat(self.schema, (), defaultdict(str, zip(keys, values)))
+        properties = dict(zip(keys, values))
+        return "".join(literal + (properties.get(field, "") if field is not None else "")
+                       for literal, field in self._parts)
+
+    def parser(self, alphabets):
+        """
+        Compile a parser for partnames of this schema.
+
+        Args:
+            alphabets: dictionary of key and list of valid values, as found
+                in the attributes of a device node.
+        """
+        return PartnameParser(self, alphabets)
+
+    def __repr__(self):
+        return "NamingSchema({})".format(self.schema)
+
+
+class PartnameParser:
+    def __init__(self, naming_schema: NamingSchema, alphabets):
+        self.naming_schema = naming_schema
+        self._keys = tuple(alphabets.keys())
+        self._fixed = {}
+        for key, values in alphabets.items():
+            if key not in naming_schema.fields:
+                if len(values) != 1:
+                    raise DeviceIdentifierException("Key '{}' is not part of the naming schema "
+                                                    "'{}' and has no unique value!"
+                                                    .format(key, naming_schema.schema))
+                self._fixed[key] = values[0]
+
+        groups = {}
+        pattern = []
+        for literal, field in naming_schema._parts:
+            pattern.append(re.escape(literal))
+            if field is None:
+                continue
+            if field in groups:
+                pattern.append("(?P={})".format(groups[field]))
+                continue
+            groups[field] = group = "g{}".format(len(groups))
+            # Longer values first, so that the regex prefers the longest match
+            values = sorted(set(alphabets.get(field, [""])), key=lambda v: (-len(v), v))
+            pattern.append("(?P<{}>{})".format(group, "|".join(re.escape(v) for v in values)))
+        self._groups = groups
+        self._regex = re.compile("".join(pattern))
+
+    def parse(self, partname):
+        """
+        Returns:
+            the DeviceIdentifier of the partname or None if it does not match
+            the naming schema and alphabets.
+        """
+        from .device_identifier import DeviceIdentifier
+        match = self._regex.fullmatch(partname)
+        if match is None:
+            return None
+        identifier = DeviceIdentifier(self.naming_schema.schema)
+        for key in self._keys:
+            group = self._groups.get(key)
+            identifier.set(key, self._fixed[key] if group is None else match.group(group))
+        return identifier
+
+
+@functools.lru_cache(maxsize=None)
+def get_naming_schema(schema):
+    """
+    Return the compiled naming schema, which is shared by all identifiers.
+    """
+    return NamingSchema(schema)
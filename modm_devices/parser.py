@@ -7,32 +7,53 @@
 XML parser for the modm files.
 """
 
+import os
+import concurrent.futures
+
 from . import pkg
-from .device_file import DeviceFile
+from .cache import DeviceFileCache, load_resolved
+from .device_file import DeviceFile, Converter
+from .device_identifier import DeviceIdentifier
 
 from .exception import ParserException
 
 # lxml must be imported **after** the Catalog file have been set by 'pkg', otherwise
 # it runs into an endless loop during verification.
+pkg.setup_catalog()
 import lxml.etree
 
 
 class Parser:
-    def __init__(self, xsdfile):
+    # Compiled XML schemas by filename, shared by all parsers of this process
+    _schemas = {}
+
+    def __init__(self, xsdfile, validate=False):
         self.xsdfile = xsdfile
+        self.validate = validate
 
     @staticmethod
-    def validate_and_parse_xml(filename, xsdfile):
+    def get_schema(xsdfile):
+        """
+        Returns the compiled XML schema, which is only compiled once per process.
+        """
+        schema = Parser._schemas.get(xsdfile)
+        if schema is None:
+            parser = lxml.etree.XMLParser(no_network=True)
+            xmlschema = lxml.etree.parse(xsdfile, parser=parser)
+            schema = lxml.etree.XMLSchema(xmlschema)
+            Parser._schemas[xsdfile] = schema
+        return schema
+
+    @staticmethod
+    def validate_and_parse_xml(filename, xsdfile, validate=False):
         try:
             # parse the xml-file
             parser = lxml.etree.XMLParser(no_network=True)
             xmlroot = lxml.etree.parse(filename, parser=parser)
             xmlroot.xinclude()
 
-            xmlschema = lxml.etree.parse(xsdfile, parser=parser)
-
-            schema = lxml.etree.XMLSchema(xmlschema)
-            # schema.assertValid(xmlroot)
+            if validate:
+                Parser.get_schema(xsdfile).assertValid(xmlroot)
 
             rootnode = xmlroot.getroot()
         except OSError as error:
@@ -48,21 +69,146 @@ class Parser:
 
 
 class DeviceParser(Parser):
-    def __init__(self):
+    def __init__(self, cache_dir=None, validate=False):
+        """
+        Args:
+            cache_dir: Optional directory in which the parsed device files
+                are cached. Defaults to the `MODM_DEVICES_CACHE` environment
+                variable, the cache is disabled if neither is set.
+            validate: Validate every parsed file against the device schema.
+                Cached files are not used in this mode, since they would
+                skip the validation.
+        """
         Parser.__init__(self,
-                        pkg.get_filename('modm_devices', 'resources/schema/device.xsd'))
+                        pkg.get_filename('modm_devices', 'resources/schema/device.xsd'),
+                        validate)
+        if cache_dir is None:
+            cache_dir = os.environ.get("MODM_DEVICES_CACHE")
+        self.cache = DeviceFileCache(cache_dir) if cache_dir else None
 
     def parse(self, filename):
-        rootnode = self.validate_and_parse_xml(filename, self.xsdfile)
+        """
+        Parse a device file. If a pre-resolved file written by
+        `store_resolved()` is next to it and up to date, it is loaded instead.
+        """
+        rootnode = None
+        if not self.validate:
+            resolved = load_resolved(filename)
+            if resolved is not None:
+                return DeviceFile.from_resolved(filename, *resolved)
+        if self.cache is not None and not self.validate:
+            rootnode = self.cache.load(filename)
+        if rootnode is None:
+            rootnode = self.validate_and_parse_xml(filename, self.xsdfile, self.validate)
+            if self.cache is not None:
+                self.cache.store(filename, rootnode)
         return DeviceFile(filename, rootnode)
 
+    def parse_properties(self, filename, identifier):
+        """
+        Resolve the properties of a single device while streaming the device
+        file with `lxml.etree.iterparse`.
+
+        Every top-level subtree of the device node (e.g. a driver) is
+        converted as soon as it has been parsed and is then freed, so the full
+        tree is never held in memory. XIncludes are not supported.
+
+        Args:
+            identifier: DeviceIdentifier or partname of the device.
+
+        Returns:
+            the property tree of the device, same as `Device.properties`.
+        """
+        device_node = None
+        naming_schema = None
+        identifiers = {DeviceFile._VALID_DEVICE: [], DeviceFile._INVALID_DEVICE: []}
+        children = []
+        try:
+            for _, node in lxml.etree.iterparse(str(filename), events=("end",),
+                                                no_network=True, remove_comments=True):
+                parent = node.getparent()
+                if parent is None or parent.getparent() is None or \
+                        parent.getparent().getparent() is not None:
+                    # only the top-level subtrees of the device node
+                    continue
+                device_node = parent
+                if node.tag == 'naming-schema':
+                    naming_schema = node.text
+                elif node.tag in identifiers:
+                    identifiers[node.tag].append(node.text)
+                else:
+                    if not isinstance(identifier, DeviceIdentifier):
+                        identifier = self._find_identifier(device_node, naming_schema,
+                                                           identifiers, identifier)
+                    converter = Converter(identifier)
+                    if converter.is_valid(node):
+                        children.append(converter.to_dict(node))
+                # free the subtree and all its processed siblings
+                node.clear()
+                while node.getprevious() is not None:
+                    del parent[0]
+        except OSError as error:
+            raise ParserException(error)
+        except lxml.etree.XMLSyntaxError as error:
+            raise ParserException("While parsing '{}': {}".format(filename, error))
+
+        if device_node is None:
+            raise ParserException("No device found in '{}'!".format(filename))
+        if not isinstance(identifier, DeviceIdentifier):
+            identifier = self._find_identifier(device_node, naming_schema,
+                                               identifiers, identifier)
+        attrib = {k: v for k, v in device_node.attrib.items() if k not in identifier.keys()}
+        return DeviceFile._to_dict('device', attrib, children or None)['device']
+
+    @staticmethod
+    def _find_identifier(device_node, naming_schema, identifiers, partname):
+        identifier = DeviceFile._parse_partname(device_node, naming_schema,
+                                                identifiers[DeviceFile._VALID_DEVICE],
+                                                identifiers[DeviceFile._INVALID_DEVICE],
+                                                partname)
+        if identifier is None:
+            raise ParserException("Device '{}' not found in device file!".format(partname))
+        return identifier
+
+    def _parse_and_resolve(self, filename, resolve):
+        device_file = self.parse(filename)
+        if resolve:
+            device_file.get_all_properties()
+        return device_file
+
+    def parse_all(self, filenames, workers=None, resolve=True):
+        """
+        Parse many device files in parallel using a pool of processes.
+
+        Args:
+            filenames: Iterable of device files to parse.
+            workers: Number of worker processes, defaults to the number of
+                CPUs. With a single worker the files are parsed serially in
+                this process.
+            resolve: Also resolve the properties of all devices in the workers
+                via `DeviceFile.get_all_properties()`.
+
+        Returns:
+            List of the parsed DeviceFile objects in the order of filenames.
+        """
+        filenames = [str(f) for f in filenames]
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1 or len(filenames) <= 1:
+            return [self._parse_and_resolve(f, resolve) for f in filenames]
+
+        chunksize = max(1, len(filenames) // (workers * 4))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self._parse_and_resolve, filenames,
+                                     [resolve] * len(filenames), chunksize=chunksize))
+
 
 class DriverParser(Parser):
-    def __init__(self):
+    def __init__(self, validate=False):
         Parser.__init__(self,
-                        xsdfile=pkg.get_filename('modm_devices', 'resources/schema/driver.xsd'))
+                        xsdfile=pkg.get_filename('modm_devices', 'resources/schema/driver.xsd'),
+                        validate=validate)
 
     def parse(self, filename):
-        rootnode = self.validate_and_parse_xml(filename, self.xsdfile)
+        rootnode = self.validate_and_parse_xml(filename, self.xsdfile, self.validate)
         return rootnode
 
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-pkgutil helper package.
+Package resource helpers.
 
 Adds a function that returns the filename rather than the content in a similar
 fashion to pkgutil.get_data().
@@ -9,11 +9,8 @@ fashion to pkgutil.get_data().
 
 import os
 import re
-import sys
-import pkgutil
-
-import urllib.request
-import urllib.parse
+import functools
+import importlib.util
 
 def naturalkey(key):
     """
@@ -28,25 +25,52 @@ def naturalkey(key):
 
     return [atoi(c) for c in re.split(r"([-]?\d+)", key)]
 
+@functools.lru_cache(maxsize=None)
 def get_filename(package, resource):
-    """Rewrite of pkgutil.get_data() that return the file path.
+    """Return the path of a package resource, similar to pkgutil.get_data(),
+    but without reading it. The paths are cached.
     """
-    loader = pkgutil.get_loader(package)
-    if loader is None or not hasattr(loader, 'get_data'):
+    try:
+        root = _package_path(package)
+    except ImportError:
         return None
-    mod = sys.modules.get(package) or loader.load_module(package)
-    if mod is None or not hasattr(mod, '__file__'):
+    if root is None:
         return None
+    return os.path.normpath(os.path.join(root, *resource.split('/')))
 
-    # Modify the resource name to be compatible with the loader.get_data
-    # signature - an os.path format "filename" starting with the dirname of
-    # the package's __file__
-    parts = resource.split('/')
-    parts.insert(0, os.path.dirname(mod.__file__))
-    resource_name = os.path.normpath(os.path.join(*parts))
+def _package_path(package):
+    try:
+        from importlib.resources import files
+    except ImportError:
+        # Python < 3.9
+        spec = importlib.util.find_spec(package)
+        if spec is None or spec.origin is None:
+            return None
+        return os.path.dirname(spec.origin)
+    return str(files(package))
 
-    return resource_name
+def iter_device_files(root=None):
+    """
+    Yields the paths of all device files in the bundled devices folder or in
+    `root`, sorted by folder and name.
+    """
+    if root is None:
+        root = get_filename('modm_devices', 'resources/devices')
+    with os.scandir(root) as entries:
+        entries = sorted(entries, key=lambda e: e.name)
+    for entry in entries:
+        if entry.is_dir():
+            yield from iter_device_files(entry.path)
+        elif entry.name.endswith(".xml"):
+            yield entry.path
 
-CATALOGFILE = get_filename('modm_devices', 'resources/catalog.xml')
-os.environ['XML_CATALOG_FILES'] = \
-    urllib.parse.urljoin('file:', urllib.request.pathname2url(CATALOGFILE))
+def setup_catalog():
+    """
+    Point libxml2 to the bundled XML catalog. This must be called before lxml
+    is imported, otherwise it runs into an endless loop during verification.
+    """
+    import urllib.parse
+    import urllib.request
+    catalogfile = get_filename('modm_devices', 'resources/catalog.xml')
+    os.environ['XML_CATALOG_FILES'] = \
+        urllib.parse.urljoin('file:', urllib.request.pathname2url(catalogfile))
@@ -10,7 +10,7 @@ with open("README.md") as f:
 setup(
     name = "modm-devices",
     version = __version__,
-    python_requires=">=3.5.0",
+    python_requires=">=3.7.0",
     packages = find_packages(exclude=["test"]),
     package_data = {
         "": ["resources/devices/*/*",
@@ -19,6 +19,7 @@ setup(
     },
 
     install_requires = ["lxml"],
+    extras_require = {"numpy": ["numpy"]},
 
     # Metadata
     author = "Niklas Hauser",
@@ -38,7 +39,7 @@ setup(
         "Operating System :: OS Independent",
         "Programming Language :: Python",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.5",
+        "Programming Language :: Python :: 3.7",
         "Topic :: Database",
         "Topic :: Software Development",
         "Topic :: Software Development :: Code Generators",
@@ -0,0 +1,88 @@
+
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from modm_devices import pkg
+from modm_devices import catalog
+from modm_devices.catalog import Catalog, build_catalog
+from modm_devices.exception import ParserException
+
+DEVICE_FILES = [pkg.get_filename('modm_devices', 'resources/devices/stm32/stm32f4-05_07_15_17.xml'),
+                pkg.get_filename('modm_devices', 'resources/devices/avr/atmega-1281_2561.xml'),
+                pkg.get_filename('modm_devices', 'resources/devices/nrf/nrf52840.xml')]
+
+class CatalogTest(unittest.TestCase):
+    # The pure Python columns, NumpyCatalogTest runs the same tests with NumPy
+    numpy = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.numpy_patch = unittest.mock.patch.object(catalog, "numpy", cls.numpy)
+        cls.numpy_patch.start()
+        cls.catalog = build_catalog(DEVICE_FILES)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.numpy_patch.stop()
+
+    def test_columns(self):
+        index = self.catalog.partnames.index("stm32f407vgt6")
+        row = {column: self.catalog[column][index] for column in self.catalog.columns()}
+        self.assertEqual(row["core"], "cortex-m4f")
+        self.assertEqual(row["fpu"], 1)
+        self.assertEqual(row["flash"], 1048576)
+        self.assertEqual(row["ram"], 196608)
+        self.assertEqual(row["package"], "LQFP100")
+        self.assertEqual(row["pins"], 100)
+        self.assertEqual(row["vectors"], 81)
+        self.assertEqual(row["driver:usart"], 4)
+        self.assertEqual(row["driver:tim"], 14)
+
+        index = self.catalog.partnames.index("atmega1281-16au")
+        self.assertEqual(self.catalog["core"][index], "avr8")
+        self.assertEqual(self.catalog["eeprom"][index], 4096)
+        self.assertEqual(self.catalog["driver:tim"][index], 0)
+
+        # code_ram aliases the ram and is not counted twice
+        index = self.catalog.partnames.index("nrf52840-xxaa")
+        self.assertEqual(self.catalog["ram"][index], 256 * 1024)
+        self.assertNotIn("nrf52840-xxaa", self.catalog.query(("ram", ">=", 512 * 1024)))
+
+    def test_query(self):
+        partnames = self.catalog.query(("flash", ">=", 512 * 1024), ("driver:usart", ">=", 3),
+                                       ("fpu", "==", 1), ("package", "==", "LQFP100"))
+        self.assertIn("stm32f407vgt6", partnames)
+        self.assertEqual(partnames, sorted(p for p in partnames if p.startswith("stm32f4")))
+        self.assertEqual(self.catalog.query(("core", "in", ["avr8", "cortex-m4"]),
+                                            ("driver:nothing", "==", 0)),
+                         [p for p in self.catalog.partnames if p.startswith("atmega")])
+        self.assertEqual(self.catalog.query(("package", "==", "unknown")), [])
+        self.assertEqual(self.catalog.query(), self.catalog.partnames)
+        self.assertRaises(ParserException, lambda: self.catalog.query(("core", ">", "avr8")))
+        self.assertRaises(ParserException, lambda: self.catalog.query(("unknown", "==", 1)))
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "catalog.bin")
+            self.catalog.save(filename)
+            catalog = Catalog.load(filename)
+        self.assertEqual(catalog.partnames, self.catalog.partnames)
+        for column in self.catalog.columns():
+            self.assertEqual(catalog[column], self.catalog[column])
+        self.assertIsNone(Catalog.load(filename))
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class NumpyCatalogTest(CatalogTest):
+    numpy = numpy
+
+    def test_numpy_columns(self):
+        self.assertIsInstance(self.catalog._column("flash"), numpy.ndarray)
+        self.assertIsInstance(self.catalog.mask("flash", ">=", 0), numpy.ndarray)
@@ -0,0 +1,81 @@
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from modm_devices import pkg
+from modm_devices.database import DeviceDatabase, export_database
+from modm_devices.exception import ParserException
+from modm_devices.parser import DeviceParser
+
+DEVICE_FILES = [pkg.get_filename('modm_devices', 'resources/devices/stm32/stm32f4-01_11.xml'),
+                pkg.get_filename('modm_devices', 'resources/devices/avr/atmega-1281_2561.xml')]
+
+class DeviceDatabaseTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.filename = os.path.join(cls.directory.name, "devices.db")
+        export_database(cls.filename, DEVICE_FILES)
+        cls.database = DeviceDatabase(cls.filename)
+        cls.device = DeviceParser().parse(DEVICE_FILES[0]).get_device("stm32f411ceu6")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.database.close()
+        cls.directory.cleanup()
+
+    def test_partnames(self):
+        partnames = self.database.partnames("STM32F411*")
+        self.assertIn("stm32f411ceu6", partnames)
+        self.assertTrue(all(p.startswith("stm32f411") for p in partnames))
+        self.assertEqual(len(self.database.partnames()),
+                         sum(len(DeviceParser().parse(f).get_devices()) for f in DEVICE_FILES))
+
+    def test_properties(self):
+        core = self.device.get_driver("core")
+        self.assertEqual([tuple(m) for m in self.database.memories(self.device.partname)],
+                         [(m["name"], m.get("access"), int(m["start"], 0), int(m["size"], 0))
+                          for m in core["memory"]])
+        self.assertEqual([v["name"] for v in self.database.vectors(self.device.partname)],
+                         [v["name"] for v in core["vector"]])
+        self.assertEqual(self.database.drivers(self.device.partname, "usart"),
+                         [("usart", "stm32", self.device.get_driver("usart")["instance"])])
+        self.assertEqual(len(self.database.drivers(self.device.partname)),
+                         len(self.device.properties["driver"]))
+
+    def test_signals(self):
+        rows = self.database.signals("stm32f411ceu6", "usart", "2", "tx", "7")
+        self.assertEqual([tuple(r) for r in rows], [("stm32f411ceu6", "a", "2", "usart", "2", "tx", "7")])
+        expected = [(g["port"], g["pin"]) for g in self.device.get_driver("gpio")["gpio"]
+                    if any(s.get("driver") == "spi" and s.get("instance") == "1" for s in g.get("signal", []))]
+        rows = self.database.signals("stm32f411ceu6", "spi", "1")
+        self.assertEqual(sorted({(r["port"], r["pin"]) for r in rows}), sorted(expected))
+
+    def test_special_characters_in_path(self):
+        directory = os.path.join(self.directory.name, "db#dir?%20")
+        os.mkdir(directory)
+        filename = os.path.join(directory, "devices.db")
+        shutil.copy(self.filename, filename)
+        with DeviceDatabase(filename) as database:
+            self.assertEqual(database.partnames(), self.database.partnames())
+            self.assertRaises(sqlite3.OperationalError,
+                              lambda: database.execute("DELETE FROM devices"))
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["db#dir?%20", "devices.db"])
+
+    def test_missing_database(self):
+        self.assertRaises(ParserException,
+                          lambda: DeviceDatabase(os.path.join(self.directory.name, "missing.db")))
+
+    def test_pins(self):
+        rows = self.database.pins("usart", "2", "tx", "stm32f411ceu6")
+        self.assertEqual([tuple(r) for r in rows], [("stm32f411ceu6", "a", "2", "7")])
+        rows = self.database.pins("spi", "1", "sck")
+        self.assertEqual([tuple(r) for r in rows],
+                         [(r["partname"], r["port"], r["pin"], r["af"])
+                          for r in self.database.signals("*", "spi", "1", "sck")])
+        self.assertTrue(self.database.pins("adc", None, "0", "atmega*"))
+        self.assertFalse(self.database.pins("usart", "9", "tx"))
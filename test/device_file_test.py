@@ -0,0 +1,213 @@
+
+import gc
+import unittest
+import weakref
+
+import lxml.etree
+
+from modm_devices import pkg
+from modm_devices.device_file import DeviceFile
+from modm_devices.exception import ParserException
+from modm_devices.parser import DeviceParser
+from modm_devices.frozen import thaw, Interner
+from modm_devices.frozen import fingerprint as fingerprint_tree
+
+DEVICE_FILE = pkg.get_filename('modm_devices', 'resources/devices/stm32/stm32f4-05_07_15_17.xml')
+
+DRIVER_FILE = """
+<modm>
+  <device platform="stm32" family="f4" name="01|11">
+    <naming-schema>{platform}{family}{name}</naming-schema>
+    <driver name="tim" type="stm32-basic"><instance value="6"/></driver>
+    <driver name="wdg"/>
+    <driver name="tim" type="stm32-advanced"><instance value="1"/></driver>
+    <driver name="tim" type="other"/>
+    <driver name="tim" type="stm32-basic" device-name="11"><instance value="7"/></driver>
+  </device>
+</modm>
+"""
+
+class DeviceDriverTest(unittest.TestCase):
+
+    def setUp(self):
+        device_file = DeviceFile("drivers.xml", lxml.etree.fromstring(DRIVER_FILE))
+        self.devices = {d.partname: d for d in device_file.get_devices()}
+        self.lazy = {d.partname: d for d in device_file.get_devices(lazy=True)}
+
+    def test_type_prefix_in_document_order(self):
+        for devices in (self.devices, self.lazy):
+            self.assertEqual([(d["type"], d["instance"]) for d in devices["stm32f411"].get_all_drivers("tim:stm32-*")],
+                             [("stm32-basic", ["6"]), ("stm32-advanced", ["1"]), ("stm32-basic", ["7"])])
+            self.assertEqual([d["instance"] for d in devices["stm32f401"].get_all_drivers("tim:stm32-*")],
+                             [["6"], ["1"]])
+            self.assertEqual([d["instance"] for d in devices["stm32f411"].get_all_drivers("tim:stm32-basic")],
+                             [["6"], ["7"]])
+            self.assertEqual(len(devices["stm32f411"].get_all_drivers("tim")), 4)
+            self.assertEqual(devices["stm32f411"].get_driver("tim:stm32-*")["instance"], ["6"])
+
+    def test_driver_without_type(self):
+        for devices in (self.devices, self.lazy):
+            device = devices["stm32f401"]
+            self.assertEqual(device.get_driver("wdg"), {"name": "wdg"})
+            self.assertTrue(device.has_driver("wdg"))
+            self.assertFalse(device.has_driver("wdg", ["stm32"]))
+            self.assertEqual(device.get_all_drivers("wdg:*"), [])
+            self.assertIsNone(device.get_driver("wdg:stm32"))
+
+    def test_invalid_driver_name(self):
+        for devices in (self.devices, self.lazy):
+            device = devices["stm32f401"]
+            self.assertRaises(ParserException, lambda: device.get_driver("tim:stm32:basic"))
+            self.assertRaises(ParserException, lambda: device.get_all_drivers("a:b:c"))
+            self.assertRaises(ParserException, lambda: device.has_driver("a:b:c"))
+            self.assertRaises(ParserException, lambda: device.has_driver("tim:stm32", ["basic"]))
+
+
+class DeviceFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.device_file = DeviceParser().parse(DEVICE_FILE)
+
+    def test_get_all_properties(self):
+        properties = self.device_file.get_all_properties()
+        devices = self.device_file.get_devices()
+        self.assertEqual(sorted(properties.keys()), sorted(d.partname for d in devices))
+        for device in devices:
+            self.assertEqual(properties[device.partname],
+                             self.device_file.get_properties(device.identifier))
+
+    def test_get_properties_copy(self):
+        self.device_file.get_all_properties()
+        devices = self.device_file.get_devices()
+        expected = devices[1].properties
+
+        properties = self.device_file.get_properties(devices[0].identifier)
+        properties["driver"][0]["name"] = "mutated"
+        self.assertEqual(devices[1].properties, expected)
+        self.assertEqual(self.device_file.get_properties(devices[1].identifier), expected)
+        self.assertNotEqual(self.device_file.get_properties(devices[0].identifier), properties)
+
+    def test_readonly_devices(self):
+        device = self.device_file.get_devices()[0]
+        frozen = self.device_file.get_devices(readonly=True)[0]
+
+        self.assertEqual(thaw(frozen.properties), device.properties)
+        self.assertIs(frozen.properties, frozen.properties)
+        with self.assertRaises(TypeError):
+            frozen.properties["driver"] = None
+        self.assertIsInstance(frozen.get_all_drivers("tim"), tuple)
+        self.assertEqual(thaw(frozen.get_all_drivers("tim")), device.get_all_drivers("tim"))
+        self.assertEqual(thaw(frozen.get_driver("gpio")), device.get_driver("gpio"))
+        self.assertTrue(frozen.has_driver("tim", ["stm32-advanced"]))
+        self.assertFalse(frozen.has_driver("tim", ["stm32"]))
+
+    def test_get_device(self):
+        for device in self.device_file.get_devices():
+            parsed = self.device_file.get_device(device.partname)
+            self.assertEqual(parsed.identifier, device.identifier)
+            self.assertEqual(parsed.identifier.keys(), device.identifier.keys())
+        self.assertIsNone(self.device_file.get_device("stm32f407"))
+        self.assertIsNone(self.device_file.get_device("stm32f407vgt6x"))
+
+    def test_lazy_devices(self):
+        device = self.device_file.get_devices()[0]
+        lazy = self.device_file.get_devices(lazy=True)[0]
+
+        self.assertEqual(lazy.get_driver("gpio"), device.get_driver("gpio"))
+        self.assertEqual(lazy.get_all_drivers("tim:stm32-*"), device.get_all_drivers("tim:stm32-*"))
+        self.assertTrue(lazy.has_driver("usart"))
+        self.assertIsNone(lazy._properties)
+        resolved = [d["name"] for d in lazy._drivers if d is not None]
+        self.assertEqual(sorted(set(resolved)), ["gpio", "tim"])
+
+        frozen = self.device_file.get_devices(readonly=True, lazy=True)[0]
+        self.assertEqual(thaw(frozen.get_driver("core")), device.get_driver("core"))
+        self.assertIs(frozen.get_driver("core"), frozen.get_driver("core"))
+        self.assertEqual(lazy.properties, device.properties)
+
+    def test_frozen_properties(self):
+        properties = {p: thaw(d) for p, d in self.device_file.get_all_properties().items()}
+        interner = Interner()
+        frozen = self.device_file.get_all_frozen_properties(interner)
+
+        self.assertIsNone(self.device_file._all_properties)
+        self.assertEqual({p: thaw(d) for p, d in frozen.items()}, properties)
+        for device in self.device_file.get_devices(readonly=True):
+            self.assertIs(device.properties, frozen[device.partname])
+            self.assertEqual(self.device_file.get_properties(device.identifier),
+                             properties[device.partname])
+
+        # Equal subtrees are shared across devices and device files
+        usarts = {id(d) for f in frozen.values() for d in f["driver"] if d["name"] == "usart"}
+        self.assertEqual(len(usarts), 1)
+        other = DeviceParser().parse(DEVICE_FILE).get_all_frozen_properties(interner)
+        self.assertIs(other[device.partname], frozen[device.partname])
+        self.assertEqual(self.device_file.get_all_properties(), properties)
+
+    def test_interner_is_owned_by_device_file(self):
+        device_file = DeviceParser().parse(DEVICE_FILE)
+        other = DeviceParser().parse(DEVICE_FILE)
+        self.assertIsNot(device_file.interner, other.interner)
+        frozen = device_file.get_devices(readonly=True)[0].properties
+        self.assertEqual(thaw(frozen), thaw(other.get_devices(readonly=True)[0].properties))
+        self.assertIsNot(frozen, other.get_devices(readonly=True)[0].properties)
+        self.assertGreater(len(device_file.interner), 0)
+
+        # the interned trees are freed together with the device file
+        device_file.get_all_frozen_properties()
+        interner = weakref.ref(device_file.interner)
+        del device_file, frozen
+        gc.collect()
+        self.assertIsNone(interner())
+
+    def test_fingerprints(self):
+        devices = self.device_file.get_devices()
+        device, other = devices[0], devices[-1]
+        fingerprint = device.fingerprint()
+
+        self.assertEqual(len(fingerprint), 64)
+        self.assertEqual(fingerprint, self.device_file.get_devices(lazy=True)[0].fingerprint())
+        self.assertNotEqual(fingerprint, other.fingerprint())
+        self.assertEqual(device.driver_fingerprint("rcc"), other.driver_fingerprint("rcc"))
+        self.assertNotEqual(device.driver_fingerprint("core"), other.driver_fingerprint("core"))
+        self.assertIsNone(device.driver_fingerprint("foo"))
+        self.assertEqual(device.driver_fingerprint("tim:stm32-*"),
+                         fingerprint_tree(device.get_all_drivers("tim:stm32-*")))
+
+        # Independent of the order of dictionary keys
+        properties = device.properties
+        properties["driver"][0] = dict(reversed(list(properties["driver"][0].items())))
+        self.assertEqual(fingerprint_tree(properties), fingerprint)
+
+        # Frozen and mutable trees of the same content have the same digest
+        readonly = self.device_file.get_devices(readonly=True)[0]
+        self.assertEqual(readonly.fingerprint(), fingerprint)
+        self.assertEqual(readonly.driver_fingerprint("tim:stm32-*"), device.driver_fingerprint("tim:stm32-*"))
+
+        # Fingerprinting mutable trees does not intern them
+        device_file = DeviceParser().parse(DEVICE_FILE)
+        for parsed in device_file.get_devices():
+            parsed.fingerprint()
+            parsed.driver_fingerprint("usart")
+        self.assertEqual(len(device_file.interner), 0)
+
+        fingerprints = self.device_file.get_fingerprints()
+        self.assertEqual(fingerprints[device.partname], fingerprint)
+        self.assertEqual(self.device_file.get_fingerprints("rcc")[other.partname],
+                         other.driver_fingerprint("rcc"))
+
+    def test_equivalence_classes(self):
+        classes = self.device_file.get_equivalence_classes()
+        partnames = [p for partnames in classes for p in partnames]
+        self.assertEqual(sorted(partnames), sorted(d.partname for d in self.device_file.get_devices()))
+        self.assertIn(["stm32f405rgt6", "stm32f405rgt7"], classes)
+
+        devices = {d.partname: d for d in self.device_file.get_devices()}
+        for partnames in classes:
+            for partname in partnames[1:]:
+                self.assertEqual(devices[partname].properties, devices[partnames[0]].properties)
+
+        without_package = self.device_file.get_equivalence_classes(["package"])
+        self.assertLess(len(without_package), len(classes))
+        for partnames in classes:
+            self.assertTrue(any(set(partnames) <= set(c) for c in without_package))
@@ -3,6 +3,8 @@ import unittest
 
 from modm_devices.exception import DeviceIdentifierException
 from modm_devices.device_identifier import DeviceIdentifier, MultiDeviceIdentifier
+from modm_devices.device_identifier import DeviceIdentifierUniverse
+from modm_devices.naming_schema import get_naming_schema
 
 class DeviceIdentifierTest(unittest.TestCase):
 
@@ -81,6 +83,7 @@ class DeviceIdentifierTest(unittest.TestCase):
         ident.set("platform", "stm32")
 
         ident2 = ident.copy()
+        self.assertIs(ident2.keys(), ident.keys())
         self.assertEqual(ident2.platform, "stm32")
         self.assertEqual(ident2.naming_schema, "{platform}")
         ident2.set("platform", "avr")
@@ -111,3 +114,95 @@ class MultiDeviceIdentifierTest(unittest.TestCase):
 
         self.ident.append(DeviceIdentifier("{one}{two}"))
         self.assertEqual(self.ident.naming_schema, "{one}{one}{two}")
+
+    def test_should_index_keys_and_values(self):
+        for name, pin in (("407", "v"), ("405", "r"), ("407", "z")):
+            ident = DeviceIdentifier("{platform}{name}{pin}")
+            ident.set("platform", "stm32")
+            ident.set("name", name)
+            ident.set("pin", pin)
+            self.ident.append(ident)
+        self.assertEqual(self.ident.keys(), ["platform", "name", "pin"])
+        self.assertEqual(self.ident.getAttribute("name"), ["405", "407"])
+        self.assertEqual(self.ident.getAttribute("pin"), ["r", "v", "z"])
+        self.assertEqual(self.ident.string, "stm32[405|407][r|v|z]")
+
+        self.ident.remove(self.ident[0])
+        self.assertEqual(self.ident.getAttribute("name"), ["407"])
+        self.assertEqual(self.ident.getAttribute("pin"), ["v", "z"])
+        self.assertEqual(self.ident.string, "stm32407[v|z]")
+
+
+class NamingSchemaTest(unittest.TestCase):
+
+    def test_format(self):
+        schema = get_naming_schema("{platform}{name}-{pin}")
+        self.assertIs(schema, get_naming_schema("{platform}{name}-{pin}"))
+        self.assertEqual(schema.fields, ("platform", "name", "pin"))
+        self.assertEqual(schema.format(("pin", "platform"), ("v", "stm32")), "stm32-v")
+        self.assertEqual(get_naming_schema("{name:>4}").format(("name",), ("07",)), "  07")
+
+    def test_parse(self):
+        parser = get_naming_schema("at{family}{name}{type}").parser(
+                {"family": ["mega"], "name": ["16", "164"], "type": ["", "4", "a"], "platform": ["avr"]})
+        ident = parser.parse("atmega164")
+        self.assertEqual(ident.string, "atmega164")
+        self.assertEqual(ident.keys(), ("family", "name", "type", "platform"))
+        self.assertEqual((ident.name, ident.type), ("164", ""))
+        # backtracks to the shorter name
+        self.assertEqual(parser.parse("atmega164a").name, "164")
+        self.assertEqual(parser.parse("atmega16a").name, "16")
+        self.assertIsNone(parser.parse("atmega32"))
+        self.assertRaises(DeviceIdentifierException,
+                          lambda: get_naming_schema("{name}").parser({"name": ["a"], "family": ["b", "c"]}))
+
+
+class DeviceIdentifierSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ids = []
+        for name in ("03", "05", "07", "10"):
+            ident = DeviceIdentifier("{platform}{name}")
+            ident.set("platform", "stm32")
+            ident.set("name", name)
+            self.ids.append(ident)
+        self.universe = DeviceIdentifierUniverse(self.ids)
+
+    def test_set_operations(self):
+        a = self.universe.bitset(self.ids[:3])
+        b = self.universe.bitset(self.ids[2:])
+        self.assertEqual(len(a), 3)
+        self.assertEqual((a | b).mask, self.universe.mask)
+        self.assertEqual(list(a & b), [self.ids[2]])
+        self.assertEqual(list(a - b), self.ids[:2])
+        self.assertEqual(list(~a), [self.ids[3]])
+        self.assertIn(self.ids[0], a)
+        self.assertNotIn(self.ids[0], b)
+        self.assertTrue(a & b <= a)
+        self.assertTrue(a >= self.ids[:1])
+
+    def test_conversion(self):
+        ids = MultiDeviceIdentifier.from_list(self.ids[1:3])
+        bitset = ids.bitset(self.universe)
+        self.assertEqual(bitset.mask, 0b0110)
+        self.assertEqual(bitset, ids)
+        self.assertEqual(ids, bitset)
+        self.assertFalse(ids != bitset)
+        self.assertNotEqual(ids, self.universe.bitset(self.ids[:1]))
+        self.assertNotEqual(ids, None)
+        self.assertEqual(hash(bitset), hash(ids))
+        self.assertEqual({ids: 1}.get(bitset), 1)
+        self.assertEqual({bitset: 1}.get(ids), 1)
+        self.assertFalse(bitset == None)
+        self.assertTrue(bitset != None)
+        self.assertNotEqual(bitset, 5)
+        self.assertEqual(bitset, self.ids[1:3])
+        self.assertNotEqual(bitset, self.ids[1:2])
+        self.assertEqual(bitset.to_multi(), ids)
+        self.assertEqual(self.universe.select("name", ["05", "10"]), 0b1010)
+
+        other = DeviceIdentifier("{platform}")
+        other.set("platform", "avr")
+        self.assertNotIn(other, bitset)
+        self.assertRaises(DeviceIdentifierException,
+                          lambda: self.universe.bitset([other]))
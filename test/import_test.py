@@ -0,0 +1,28 @@
+
+import os
+import subprocess
+import sys
+import unittest
+
+class LazyImportTest(unittest.TestCase):
+
+    def run_python(self, code):
+        env = {k: v for k, v in os.environ.items() if k != "XML_CATALOG_FILES"}
+        return subprocess.check_output([sys.executable, "-c", code], env=env, text=True).strip()
+
+    def test_lazy_import(self):
+        self.assertEqual(self.run_python(
+                "import sys, modm_devices; "
+                "print(sorted(m for m in sys.modules if m.startswith(('modm_devices.', 'lxml'))))"), "[]")
+        self.assertEqual(self.run_python(
+                "import sys; from modm_devices import naturalkey; "
+                "from modm_devices.device_identifier import DeviceIdentifier; "
+                "print('lxml' in sys.modules, 'XML_CATALOG_FILES' in __import__('os').environ)"), "False False")
+
+    def test_exports(self):
+        import modm_devices
+        from modm_devices.parser import DeviceParser
+        self.assertIs(modm_devices.parser.DeviceParser, DeviceParser)
+        self.assertIs(modm_devices.ParserException, modm_devices.exception.ParserException)
+        self.assertIn("find_devices", dir(modm_devices))
+        self.assertRaises(AttributeError, lambda: modm_devices.unknown)
@@ -0,0 +1,47 @@
+
+import os
+import fnmatch
+import tempfile
+import unittest
+
+from modm_devices import index, pkg
+
+class DeviceIndexTest(unittest.TestCase):
+
+    def test_index_is_up_to_date(self):
+        self.assertEqual(index.read_index(), index.build_index())
+
+    def test_write_index(self):
+        data = {"version": index.INDEX_VERSION, "files": {"a.xml": "{platform}"},
+                "devices": {"a": "a.xml"}}
+        with tempfile.TemporaryDirectory() as root:
+            index.write_index(data, root)
+            index.write_index(data, root)
+            self.assertEqual(os.listdir(root), [index.INDEX_FILENAME])
+            self.assertEqual(index.read_index(root), data)
+
+    def test_find_device(self):
+        device = index.find_device("STM32F407VGT6")
+        self.assertEqual(device.partname, "stm32f407vgt6")
+        self.assertTrue(device.device_file.filename.endswith("stm32f4-05_07_15_17.xml"))
+        self.assertEqual(device.naming_schema, index.get_index()["files"]["stm32/stm32f4-05_07_15_17.xml"])
+
+        self.assertEqual(index.find_device("stm32h745xih6@m4").partname, "stm32h745xih6@m4")
+        self.assertIsNone(index.find_device("stm32f407"))
+
+    def test_find_devices(self):
+        partnames = index.get_partnames()
+        self.assertEqual(index.find_devices("STM32F4*"), [p for p in partnames if p.startswith("stm32f4")])
+        self.assertEqual(index.find_devices("stm32f407vgt6"), ["stm32f407vgt6"])
+        self.assertEqual(index.find_devices("stm32f407vg[tx]6"), ["stm32f407vgt6"])
+        self.assertEqual(index.find_devices("atmega32??-au"), fnmatch.filter(partnames, "atmega32??-au"))
+        self.assertEqual(index.find_devices("*t6"), fnmatch.filter(partnames, "*t6"))
+        self.assertEqual(index.find_devices("*"), partnames)
+        self.assertEqual(index.find_devices("stm32f407"), [])
+
+    def test_iter_device_files(self):
+        root = index.devices_path()
+        self.assertEqual([index._relpath(f, root) for f in pkg.iter_device_files()],
+                         sorted(index.get_index()["files"]))
+        self.assertIs(pkg.get_filename('modm_devices', 'resources/devices'), root)
+        self.assertIsNone(pkg.get_filename('modm_devices_unknown', 'resources'))
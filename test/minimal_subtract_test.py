@@ -0,0 +1,124 @@
+
+import os
+import itertools
+import unittest
+
+from modm_devices import pkg
+from modm_devices.index import get_index
+from modm_devices.parser import DeviceParser
+from modm_devices.device_identifier import DeviceIdentifier, MultiDeviceIdentifier
+
+
+def exhaustive_minimal_subtract_set(self, complete, parent):
+    """
+    The original exhaustive search over all key combinations.
+    """
+    def partly_inside(mkeys, ids, did):
+        return any( all( cid[k] == did[k] for k in mkeys ) for cid in ids )
+
+    def minimal_keys():
+        keys = [k for k in self.keys() if not all( all(s[k] == p[k] for p in parent) for s in self)]
+        for clength in range(len(keys)):
+            for kcomb in itertools.combinations(keys, clength):
+                if not clength:
+                    filtered = parent
+                else:
+                    filtered = complete.filter(lambda i: partly_inside(kcomb, self, i))
+                if filtered == self:
+                    return kcomb
+        return keys
+
+    def filtered_by_keys(mkeys, ids):
+        nids = MultiDeviceIdentifier()
+        for k in mkeys:
+            for m in ids.getAttribute(k):
+                ident = DeviceIdentifier(self.naming_schema)
+                ident.set(k, m)
+                nids.append(ident)
+        return nids
+
+    def product_inside(mkeys, ids, did):
+        nids = ids.copy()
+        nids.append(did)
+        pids = filtered_by_keys(mkeys, nids).product()
+        return all( partly_inside(mkeys, self, i) for i in pids )
+
+    mkeys = minimal_keys()
+
+    cids = [ MultiDeviceIdentifier() ]
+    for did in self:
+        for ids in cids:
+            if product_inside(mkeys, ids, did):
+                ids.append(did)
+                break
+        else:
+            cids.append( MultiDeviceIdentifier(did) )
+
+    fids = [filtered_by_keys(mkeys, ids) for ids in cids]
+    fids.sort(key=lambda d: d.string)
+    return fids
+
+
+def exhaustive_minimal_subtract(self, complete, others):
+    def minimal_keys(absolute, diff):
+        keys = diff.keys()
+        for clength in range(len(keys)):
+            for kcomb in itertools.combinations(keys, clength):
+                filtered = complete.filter(lambda i: any(i[k] in diff.getAttribute(k) for k in kcomb))
+                if filtered == absolute:
+                    return kcomb
+        return keys
+
+    diff = self.subtract(others)
+    ids = MultiDeviceIdentifier()
+    for k in minimal_keys(self, diff):
+        for m in diff.getAttribute(k):
+            ident = DeviceIdentifier(self.naming_schema)
+            ident.set(k, m)
+            ids.append(ident)
+    return ids
+
+
+def node_identifiers(device_file):
+    """
+    Yields the complete, node and parent identifiers of every distinct node
+    of the device file, as they are passed to the DeviceFileWriter.
+    """
+    device_file.get_properties(device_file.get_devices()[0].identifier)
+    ids = device_file._identifiers
+    def to_ids(mask):
+        return MultiDeviceIdentifier.from_list([did for bit, did in enumerate(ids) if mask & (1 << bit)])
+
+    complete = to_ids(device_file._universe)
+    seen = set()
+    def walk(node, parent_mask):
+        for child in node:
+            if not isinstance(child.tag, str) or device_file._is_ignored(child):
+                continue
+            mask = parent_mask & device_file._selector_mask(child)
+            if mask and (mask, parent_mask) not in seen:
+                seen.add((mask, parent_mask))
+                yield complete, to_ids(mask), to_ids(parent_mask)
+            yield from walk(child, mask)
+    yield from walk(device_file.rootnode.find("device"), device_file._universe)
+
+
+class MinimalSubtractTest(unittest.TestCase):
+
+    def test_equivalence_with_exhaustive_search(self):
+        parser = DeviceParser()
+        # By default every tenth device file keeps the runtime reasonable,
+        # set MODM_DEVICES_TEST_ALL=1 to check all device files.
+        paths = sorted(get_index()["files"])
+        if not os.environ.get("MODM_DEVICES_TEST_ALL"):
+            paths = paths[::10]
+        for path in paths:
+            filename = pkg.get_filename('modm_devices', 'resources/devices/' + path)
+            for complete, ids, parent in node_identifiers(parser.parse(filename)):
+                with self.subTest(filename=path, ids=ids.string):
+                    expected = exhaustive_minimal_subtract_set(ids, complete, parent)
+                    result = ids.minimal_subtract_set(complete, parent)
+                    self.assertEqual([d.string for d in result], [d.string for d in expected])
+
+                    expected = exhaustive_minimal_subtract(ids, complete, parent)
+                    self.assertEqual(ids.minimal_subtract(complete, parent).string, expected.string)
@@ -0,0 +1,141 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import lxml.etree
+
+from modm_devices import pkg
+from modm_devices.cache import store_resolved, resolved_filename
+from modm_devices.element import Element
+from modm_devices.exception import ParserException
+from modm_devices.parser import DeviceParser
+
+DEVICE_FILE = pkg.get_filename('modm_devices', 'resources/devices/stm32/stm32f4-05_07_15_17.xml')
+
+class DeviceParserCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.device_file = os.path.join(self.cache_dir, "device.xml")
+        shutil.copy(DEVICE_FILE, self.device_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_warm_parse_from_cache(self):
+        cold = DeviceParser(self.cache_dir).parse(self.device_file)
+        self.assertNotIsInstance(cold.rootnode, Element)
+
+        warm = DeviceParser(self.cache_dir).parse(self.device_file)
+        self.assertIsInstance(warm.rootnode, Element)
+
+        cold_devices = cold.get_devices()
+        warm_devices = warm.get_devices()
+        self.assertEqual([d.partname for d in cold_devices],
+                         [d.partname for d in warm_devices])
+        self.assertEqual(cold_devices[0].properties, warm_devices[0].properties)
+
+    def test_cache_invalidation(self):
+        parser = DeviceParser(self.cache_dir)
+        parser.parse(self.device_file)
+
+        # touching the file without changing the content keeps the entry
+        os.utime(self.device_file, (0, 0))
+        self.assertIsInstance(parser.parse(self.device_file).rootnode, Element)
+
+        with open(self.device_file, "a") as device_file:
+            device_file.write("\n")
+        self.assertNotIsInstance(parser.parse(self.device_file).rootnode, Element)
+
+
+class DeviceParserResolvedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.device_file = os.path.join(self.directory, "device.xml")
+        shutil.copy(DEVICE_FILE, self.device_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_parse_resolved(self):
+        parsed = DeviceParser().parse(self.device_file)
+        self.assertEqual(store_resolved(parsed), resolved_filename(self.device_file))
+
+        resolved = DeviceParser().parse(self.device_file)
+        self.assertIsInstance(resolved.rootnode, Element)
+        self.assertIsNotNone(resolved._all_properties)
+        self.assertEqual(resolved.filename, self.device_file)
+        self.assertEqual([d.partname for d in resolved.get_devices()],
+                         [d.partname for d in parsed.get_devices()])
+        self.assertEqual(resolved.get_devices()[-1].properties, parsed.get_devices()[-1].properties)
+        # validation always parses the XML instead of loading the resolved file
+        validated = DeviceParser(validate=True).parse(self.device_file)
+        self.assertIsInstance(validated.rootnode, lxml.etree._Element)
+        self.assertIsNone(validated._all_properties)
+
+        # a device file that is newer than its resolved file is parsed again
+        stat = os.stat(resolved_filename(self.device_file))
+        os.utime(self.device_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertNotIsInstance(DeviceParser().parse(self.device_file).rootnode, Element)
+
+
+class DeviceParserValidationTest(unittest.TestCase):
+
+    def test_schema_is_compiled_once(self):
+        parser = DeviceParser()
+        self.assertIs(parser.get_schema(parser.xsdfile), DeviceParser().get_schema(parser.xsdfile))
+
+    def test_validation(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".xml") as device_file:
+            device_file.write('<modm version="0.4.0"><unknown/></modm>')
+            device_file.flush()
+            self.assertIsNotNone(DeviceParser().parse(device_file.name).rootnode)
+            self.assertRaises(ParserException,
+                              lambda: DeviceParser(validate=True).parse(device_file.name))
+
+    def test_validate_bundled_files(self):
+        parser = DeviceParser(validate=True)
+        for filename in pkg.iter_device_files():
+            with self.subTest(filename=os.path.basename(filename)):
+                self.assertIsNotNone(parser.parse(filename).rootnode)
+
+    def test_validation_rejects_unknown_attribute(self):
+        with open(DEVICE_FILE) as device_file:
+            content = device_file.read().replace("<memory ", '<memory unknown="1" ', 1)
+        with tempfile.NamedTemporaryFile("w", suffix=".xml") as device_file:
+            device_file.write(content)
+            device_file.flush()
+            self.assertIsNotNone(DeviceParser().parse(device_file.name).rootnode)
+            self.assertRaises(ParserException,
+                              lambda: DeviceParser(validate=True).parse(device_file.name))
+
+
+class DeviceParserParseAllTest(unittest.TestCase):
+
+    def test_parse_all(self):
+        filenames = [DEVICE_FILE, pkg.get_filename('modm_devices', 'resources/devices/avr/atmega-1281_2561.xml')]
+        serial = DeviceParser().parse_all(filenames, workers=1)
+        parallel = DeviceParser().parse_all(filenames, workers=2)
+
+        self.assertEqual([f.filename for f in parallel], filenames)
+        for sfile, pfile in zip(serial, parallel):
+            sdevices = sfile.get_devices()
+            pdevices = pfile.get_devices()
+            self.assertEqual([d.partname for d in sdevices], [d.partname for d in pdevices])
+            self.assertEqual(sdevices[-1].properties, pdevices[-1].properties)
+            self.assertEqual(pfile.get_properties(pdevices[0].identifier),
+                             DeviceParser().parse(pfile.filename).get_devices()[0].properties)
+
+
+class DeviceParserStreamingTest(unittest.TestCase):
+
+    def test_parse_properties(self):
+        parser = DeviceParser()
+        device = parser.parse(DEVICE_FILE).get_devices()[3]
+        self.assertEqual(parser.parse_properties(DEVICE_FILE, device.partname), device.properties)
+        self.assertEqual(parser.parse_properties(DEVICE_FILE, device.identifier), device.properties)
+        self.assertRaises(ParserException,
+                          lambda: parser.parse_properties(DEVICE_FILE, "stm32f407"))
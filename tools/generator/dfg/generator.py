@@ -10,7 +10,7 @@ from .merger import DeviceMerger
 from .output.device_file import DeviceFileWriter
 from modm_devices.parser import DeviceParser
 
-def run(output, devices, groups, filename, check_merge=False):
+def run(output, devices, groups, filename, check_merge=False, resolved=False):
     def localpath(path):
         return Path(__file__).resolve().parents[1] / path
 
@@ -25,7 +25,7 @@ def run(output, devices, groups, filename, check_merge=False):
     parsed_devices = {}
     for dev in mergedDevices:
         # dump the merged device file into the devices folder
-        path = DeviceFileWriter.write(dev, output, filename)
+        path = DeviceFileWriter.write(dev, output, filename, resolved)
         if check_merge:
             # immediately parse this file
             device_file = parser.parse(path)
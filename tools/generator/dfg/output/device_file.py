@@ -9,6 +9,8 @@ import logging
 from lxml import etree
 
 from ..device_tree import DeviceTree
+from modm_devices.cache import store_resolved, resolved_filename
+from modm_devices.parser import DeviceParser
 
 LOGGER = logging.getLogger('dfg.output.xml')
 
@@ -85,7 +87,11 @@ class DeviceFileWriter:
                               xml_declaration=True)
 
     @staticmethod
-    def write(tree, folder, name):
+    def write(tree, folder, name, resolved=False):
+        """
+        Writes the device file and, if `resolved` is set, the pre-resolved
+        binary file next to it, which `DeviceParser.parse` loads instead.
+        """
         path = os.path.join(str(folder), name(tree.ids) + '.xml')
         content = DeviceFileWriter.format(tree).decode('utf-8')
 
@@ -95,4 +101,9 @@ class DeviceFileWriter:
             LOGGER.info("New XML file: '%s'", os.path.basename(path))
         with open(path, 'w') as device_file:
             device_file.write(content)
+        if resolved:
+            store_resolved(DeviceParser().parse(path))
+        elif os.path.exists(resolved_filename(path)):
+            # A stale pre-resolved file is ignored, but remove it anyway
+            os.unlink(resolved_filename(path))
         return path
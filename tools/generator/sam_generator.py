@@ -16,6 +16,7 @@ from dfg.sam.sam_groups import sam_groups
 arg = argparse.ArgumentParser(description="Device File Generator for SAM")
 arg.add_argument("--log-level", default="INFO", nargs="?", choices=["ERROR", "WARNING", "INFO", "DEBUG", "DISABLED"], help="Choose the output log level")
 arg.add_argument("--check-merge", default=False, action="store_true", help="Brute-force check the merge algorithm")
+arg.add_argument("--resolved", default=False, action="store_true", help="Also write pre-resolved binary device files")
 arg.add_argument("filter", nargs = "*", help="Only consider devices starting with this string")
 args = arg.parse_args()
 dfg.logger.configure_logger(args.log_level)
@@ -42,4 +43,5 @@ def filename(ids):
     return fmt.format(**p)
 
 dfg.generator.run(output="sam", devices=devices, groups=sam_groups,
-                  filename=filename, check_merge=args.check_merge)
+                  filename=filename, check_merge=args.check_merge,
+                  resolved=args.resolved)
@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, sys
+
+rootpath = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..")
+sys.path.append(rootpath)
+import modm_devices.index
+
+if __name__ == "__main__":
+    devices = os.path.join(rootpath, "devices")
+    index = modm_devices.index.build_index(devices)
+    modm_devices.index.write_index(index, devices)
+    print("Indexed {} devices in {} files.".format(len(index["devices"]), len(index["files"])))